@@ -1,14 +1,27 @@
-import csv
+import atexit
 import datetime
+import hashlib
 import os
-import re
+import random
+import secrets
+import time
+from typing import Iterable, Iterator
 
-from flask import Flask, render_template, request, session
+from flask import Flask, g, render_template, request, session, stream_template
 import flask
+import assets
+import catalog_reload
 import content
 import display.lists
 import display.quiz
 import display.tzahle
+import guess_store
+import matching
+import metrics
+import objection_sink
+import profiling
+import response_cache
+import search
 
 
 app = Flask(__name__)
@@ -16,6 +29,172 @@ app = Flask(__name__)
 if app.secret_key is None:
     app.secret_key = os.environ.get('SECRET_KEY',
                                     '64b29b9e8f970f9fc7fbc10bc20585841162bd3fe1088b1a47b227e19620471c8b2e1a422bc3d7730864db8c3952b8ae')
+# Whether to accept guesses with typos and missing or extra niqqud and punctuation, and not just exact alt names
+app.config.setdefault('FUZZY_MATCHING', os.environ.get('FUZZY_MATCHING', '0') != '0')
+# Whether recursive directory listings are drawn out of atlases, built by images.py, by default
+app.config.setdefault('DIR_ATLAS', os.environ.get('DIR_ATLAS', '0') != '0')
+# Rendered directory listings, by tag and listing mode
+app.config.setdefault('DIR_CACHE_SIZE', int(os.environ.get('DIR_CACHE_SIZE', 256)))
+dir_cache = response_cache.ResponseCache(app.config['DIR_CACHE_SIZE'])
+# Whether recursive listings missing from the cache are sent while being rendered, in chunks of about this many chars
+app.config.setdefault('DIR_STREAMING', os.environ.get('DIR_STREAMING', '1') != '0')
+app.config.setdefault('DIR_STREAM_CHUNK_SIZE', int(os.environ.get('DIR_STREAM_CHUNK_SIZE', 8192)))
+# Where players' guesses are kept, the session cookie has only their session ID. Either sqlite, which is shared between
+# all workers, or memory, which fits only a single worker. Guesses are kept for the TTL since they were last updated.
+app.config.setdefault('GUESS_STORE', os.environ.get('GUESS_STORE', 'sqlite'))
+app.config.setdefault('GUESS_STORE_PATH', os.environ.get('GUESS_STORE_PATH', os.path.join(app.root_path, 'guesses.db')))
+app.config.setdefault('GUESS_STORE_TTL', int(os.environ.get('GUESS_STORE_TTL', 2 * 24 * 60 * 60)))
+guesses_store = guess_store.create(app.config['GUESS_STORE'], app.config['GUESS_STORE_PATH'],
+                                   app.config['GUESS_STORE_TTL'])
+# Objections are written in batches, of up to the batch size and at most the interval (in seconds) apart
+app.config.setdefault('OBJECTIONS_PATH',
+                      os.environ.get('OBJECTIONS_PATH', os.path.join(app.root_path, 'objections.csv')))
+app.config.setdefault('OBJECTIONS_BATCH_SIZE', int(os.environ.get('OBJECTIONS_BATCH_SIZE', 100)))
+app.config.setdefault('OBJECTIONS_FLUSH_INTERVAL', float(os.environ.get('OBJECTIONS_FLUSH_INTERVAL', 1)))
+objections = objection_sink.ObjectionSink(app.config['OBJECTIONS_PATH'],
+                                          app.config['OBJECTIONS_BATCH_SIZE'], app.config['OBJECTIONS_FLUSH_INTERVAL'])
+atexit.register(objections.close)
+# Quiz tags sent ahead to players in a single request, by default and at most, for their images to be preloaded
+app.config.setdefault('QUIZ_QUEUE_BATCH_SIZE', int(os.environ.get('QUIZ_QUEUE_BATCH_SIZE', 5)))
+app.config.setdefault('QUIZ_QUEUE_MAX_BATCH_SIZE', int(os.environ.get('QUIZ_QUEUE_MAX_BATCH_SIZE', 20)))
+# Guesses players often objected over, accepted as alt names. Created by objection_aliases.py.
+app.config.setdefault('ALIASES_PATH', os.environ.get('ALIASES_PATH', os.path.join(app.root_path, 'aliases.json')))
+matching.load_aliases(app.config['ALIASES_PATH'])
+# How often, in seconds, to check whether content.py changed and reload the catalog if it did. 0 never checks.
+app.config.setdefault('CATALOG_RELOAD_INTERVAL', float(os.environ.get('CATALOG_RELOAD_INTERVAL', 0)))
+catalog_watcher = catalog_reload.Watcher(app.config['CATALOG_RELOAD_INTERVAL'], app.config['ALIASES_PATH'],
+                                         on_swap=(dir_cache.invalidate,))
+# Whether to record request latencies, response and session cookie sizes, guesses and content lookups, served at
+# /metrics. Every worker writes its own to a file in the directory every flush interval (in seconds), for any worker to
+# serve those of all of them. Without a directory only the values of the worker serving /metrics are served.
+app.config.setdefault('METRICS', os.environ.get('METRICS', '1') != '0')
+app.config.setdefault('METRICS_DIR', os.environ.get('METRICS_DIR', os.path.join(app.root_path, 'metrics')))
+app.config.setdefault('METRICS_FLUSH_INTERVAL', float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)))
+metrics_files = metrics.ProcessFiles(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL']) \
+    if app.config['METRICS_DIR'] else None
+
+
+def objection_metrics() -> dict[metrics.Key, float]:
+    stats = objections.stats()
+    return {('objection_queue_depth', ()): stats['queue_depth'],
+            ('objection_flushes_total', ()): stats['flushes'],
+            ('objection_rows_written_total', ()): stats['rows_written'],
+            ('objection_flush_seconds_total', ()): stats['total_flush_latency']}
+
+
+if app.config['METRICS']:
+    metrics.instrument(content, ('find_unit_tag', 'build_full_path', 'build_image_path', 'get_all_unit_tags',
+                                 'get_all_tags_in_path'))
+    metrics.registry.collectors.append(objection_metrics)
+# Requests profiled with cProfile (cpu mode) or tracemalloc (memory mode), either a random sample of them at the rate
+# (0 samples none), or those with an X-Profile header set to the mode and an X-Profile-Token header set to the token
+# (without a token none). The last kept profiles are listed at /profiles, for requests with the token.
+app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('PROFILE_SAMPLE_RATE', 0)))
+app.config.setdefault('PROFILE_SAMPLE_MODE', os.environ.get('PROFILE_SAMPLE_MODE', 'cpu'))
+app.config.setdefault('PROFILE_TOKEN', os.environ.get('PROFILE_TOKEN'))
+app.config.setdefault('PROFILE_DIR', os.environ.get('PROFILE_DIR', os.path.join(app.root_path, 'profiles')))
+app.config.setdefault('PROFILE_KEEP', int(os.environ.get('PROFILE_KEEP', 100)))
+profiler = profiling.Profiler(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])
+# The Tzahle schedule is loaded and checked against the catalog once at startup, instead of on the first request
+if os.path.exists(os.path.join(app.root_path, display.tzahle.START_DATE_FILE)):
+    display.tzahle.init_if_needed()
+
+
+@app.before_request
+def start_catalog_watcher():
+    if app.config['CATALOG_RELOAD_INTERVAL'] > 0:
+        catalog_watcher.start()
+
+
+@app.before_request
+def start_request_metrics():
+    if app.config['METRICS']:
+        g.metrics_start = time.perf_counter()
+        if metrics_files is not None:
+            metrics_files.start()
+        metrics.registry.observe('session_cookie_size_bytes', (),
+                                 len(request.cookies.get(app.config['SESSION_COOKIE_NAME'], '')))
+
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        labels = (('endpoint', request.endpoint or 'none'),)
+        metrics.registry.observe('request_duration_seconds', labels, time.perf_counter() - start)
+        if response.content_length is not None:
+            metrics.registry.observe('response_size_bytes', labels, response.content_length)
+    return response
+
+
+def profile_token_matches() -> bool:
+    """Whether the request has the profiling token, in the X-Profile-Token header or the token argument"""
+    token = app.config['PROFILE_TOKEN']
+    given = request.headers.get('X-Profile-Token', request.args.get('token'))
+    return bool(token) and given is not None and secrets.compare_digest(given.encode(), token.encode())
+
+
+@app.before_request
+def start_profile():
+    mode = request.headers.get('X-Profile')
+    if mode is not None:
+        if not profile_token_matches():
+            return
+        if mode not in profiling.MODES:
+            return 'invalid profiling mode', 400
+    elif app.config['PROFILE_SAMPLE_RATE'] and random.random() < app.config['PROFILE_SAMPLE_RATE'] and \
+            request.endpoint not in ('static', 'profiles', 'profile_file'):
+        mode = app.config['PROFILE_SAMPLE_MODE']
+    else:
+        return
+    g.profile = profiler.start(mode, request.method, request.full_path.rstrip('?'), request.endpoint)
+
+
+@app.after_request
+def finish_streamed_profile(response):
+    """Streamed responses are rendered while being sent, their profile is finished only after they were"""
+    profile = g.get('profile')
+    if profile is not None:
+        g.profile_status = response.status_code
+        if response.is_streamed:
+            g.profile = None
+            response.call_on_close(lambda: finish_profile_safely(profile, response.status_code))
+    return response
+
+
+@app.teardown_request
+def finish_profile(_):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        finish_profile_safely(profile, g.get('profile_status', 500))
+
+
+def finish_profile_safely(profile: profiling.Profile, status: int):
+    try:
+        profiler.finish(profile, status)
+    except OSError as e:
+        app.logger.warning(f'Writing a profile failed: {e!r}')
+
+
+@app.url_defaults
+def fingerprint_static(endpoint, values):
+    """Adds the content hash of static files to their URLs, for them to be cached forever"""
+    if endpoint == 'static' and assets.VERSION_ARG not in values:
+        digest = assets.fingerprint(values['filename'])
+        if digest is not None:
+            values[assets.VERSION_ARG] = digest
+
+
+@app.after_request
+def cache_static(response):
+    """Static files requested by their current content hash never change, no need for browsers to revalidate them"""
+    if request.endpoint == 'static' and response.status_code == 200 and \
+            request.args.get(assets.VERSION_ARG) == assets.fingerprint(request.view_args['filename']):
+        response.cache_control.public = True
+        response.cache_control.max_age = assets.IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
 
 
 @app.route('/')
@@ -29,15 +208,50 @@ def index():
 def units_dir(tag_path=''):
     if tag_path == '' and 'q' in request.args:
         tag_path = request.args['q'].replace('-', '/')
-    return render_template('lists.html',
-                           c=content,
-                           d=display.lists,
-                           q=tag_path,
-                           r='r' in request.args)
+    recurse = 'r' in request.args
+    # In atlas mode recursive listings draw tiles out of a few sprite sheets, instead of an image per tile
+    atlas_mode = app.config['DIR_ATLAS'] or 'atlas' in request.args
+    catalog = content.current()
+    tag = catalog.index.find(tag_path) if tag_path else catalog.unit_tags
+    if tag is None:
+        return 'no such tag', 404
+    # The page depends only on the tag and these flags, so different paths to the same tag share a page. Pages of
+    # catalogs from before a reload are never served again.
+    key = (catalog.version, request.script_root, content.build_full_path(tag), recurse, atlas_mode)
+    page = dir_cache.get(key)
+    if page is None:
+        # Large recursive listings are sent while they're rendered, so the browser can start loading images sooner
+        stream = recurse and app.config['DIR_STREAMING']
+        context = dict(c=content,
+                       d=display.lists,
+                       q=tag_path,
+                       r=recurse,
+                       stream=stream,
+                       atlas=display.lists.find_atlas(tag_path, recurse) if atlas_mode else None)
+        if stream:
+            return app.response_class(stream_page(key, stream_template('lists.html', **context)), mimetype='text/html')
+        page = dir_cache.put(key, render_template('lists.html', **context))
+    response = app.response_class(page.body, mimetype='text/html')
+    response.set_etag(page.etag)
+    return response.make_conditional(request)
 
 
-def sanitize_guess(guess: bytes) -> str:
-    return re.sub(r'\s+', ' ', guess.decode('utf-8').translate(content.no_punc_trans).strip())
+def stream_page(key, parts: Iterable[str]) -> Iterator[str]:
+    """Yields the rendered parts of a directory listing in chunks, caching the page once it's complete"""
+    chunks = []
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= app.config['DIR_STREAM_CHUNK_SIZE']:
+            chunks.append(''.join(buffer))
+            yield chunks[-1]
+            buffer = []
+            size = 0
+    chunks.append(''.join(buffer))
+    yield chunks[-1]
+    dir_cache.put(key, ''.join(chunks))
 
 
 def build_answer_response(tag: content.Symbol, **kwargs) -> dict:
@@ -45,23 +259,74 @@ def build_answer_response(tag: content.Symbol, **kwargs) -> dict:
     return {'resp_type': 'answer', 'name': tag.name, 'path': tag_path, 'rel_path': flask.url_for('units_dir', tag_path=tag_path), **kwargs}
 
 
+@app.route('/search')
+def search_tags():
+    """Autocomplete search over the names of all tags and groups. Returns a JSON list (key: results) of the tags
+    having a name with a word starting with the q argument, best matches first, with their full name (key: name),
+    path (key: path) and relative URL to see the tag (key: rel_path). The limit argument sets how many to return."""
+    limit = request.args.get('limit', 10, type=int)
+    if not 0 < limit <= search.MAX_LIMIT:
+        return 'invalid limit', 400
+    results = search.get_search_index().search(request.args.get('q', ''), limit)
+    return {'results': [{'name': tag.name, 'path': path, 'rel_path': flask.url_for('units_dir', tag_path=path)}
+                        for tag, path in results]}
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Metrics of all workers, in the Prometheus text format"""
+    if not app.config['METRICS']:
+        return 'metrics are disabled', 404
+    if metrics_files is None:
+        values = metrics.registry.collect()
+    else:
+        # This worker's file is brought up to date, the others are at most a flush interval old
+        metrics_files.write()
+        values = metrics_files.read_all()
+    return app.response_class(metrics.render(values), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route('/profiles')
+def profiles():
+    """The kept profiles of requests, newest first"""
+    if not profile_token_matches():
+        return 'not found', 404
+    return render_template('profiles.html', profiles=profiler.list(), token=request.args.get('token'))
+
+
+@app.route('/profiles/<name>')
+def profile_file(name):
+    """A profile's file, or with the summary argument, a CPU profile's slowest functions as text"""
+    if not profile_token_matches():
+        return 'not found', 404
+    file_name = profiler.file_name(name)
+    if file_name is None:
+        return 'no such profile', 404
+    if 'summary' in request.args and file_name.endswith(profiling.EXTENSIONS['cpu']):
+        return app.response_class(profiler.summary(name), mimetype='text/plain')
+    return flask.send_from_directory(app.config['PROFILE_DIR'], file_name, as_attachment=True)
+
+
 @app.route('/tzahle', methods=['GET', 'POST'])
 def tzahle():
     if request.method == 'GET':
-        session.setdefault('tzahle_guesses', [])
         return render_template('tzahle.html', c=content, d=display.tzahle)
     else:  # POST, player's guess checking
-        tag = display.tzahle.get_tag_by_day_num(session.get('day_num', None))
-        guess = sanitize_guess(request.data)
-        answer_dict = build_answer_response(tag)
-        guesses = session.get('tzahle_guesses') or []
-        session['tzahle_guesses'] = guesses.append(guess)
-        if guess in tag.alt_names:
-            return answer_dict
-        guess_words = guess.split(" ")
+        # Players who got their day from the cacheable offset endpoint send it along, as it isn't in their session
+        day_num = request.args.get('day', None, type=int)
+        if day_num is not None and not display.tzahle.is_current_day_num(day_num):
+            return 'invalid day', 400
+        day = display.tzahle.get_day_by_day_num(session.get('day_num', None) if day_num is None else day_num)
+        if day is None:
+            return 'no tag for this day', 400
+        guess = matching.sanitize_guess(request.data)
+        if matching.is_answer(day.tag, guess, app.config['FUZZY_MATCHING']):
+            metrics.registry.inc('guesses_total', (('game', 'tzahle'), ('outcome', 'correct')))
+            day.prepare()
+            return day.answer
+        metrics.registry.inc('guesses_total', (('game', 'tzahle'), ('outcome', 'hint')))
         # Collect all words in guess that are in any alt name of the tag
-        words_in_answers = set([str(i) for i in range(len(guess_words)) for name in tag.alt_names if guess_words[i] in name])
-        return {'resp_type': 'hint', 'word_indices': list(words_in_answers)}
+        return {'resp_type': 'hint', 'word_indices': day.matcher.hint_indices(guess.split(" "))}
 
 
 @app.route('/tzahle/offset', methods=['POST'])
@@ -70,10 +335,31 @@ def tzahle_offset():
         offset = int(request.data)
     except ValueError:
         return 'invalid offset', 400
-    player_time = datetime.datetime.utcnow() - datetime.timedelta(minutes=offset)
-    tag, day_num = display.tzahle.get_tag_by_date(player_time.date())
-    session['day_num'] = day_num
-    return content.build_full_image_path(tag)
+    player_time = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=offset)
+    day = display.tzahle.get_day_by_date(player_time.date())
+    if day is None:
+        return 'no tag for this day', 400
+    session['day_num'] = day.day_num
+    day.prepare()
+    return day.image_url
+
+
+@app.route('/tzahle/offset/<int(signed=True):offset>')
+def tzahle_day(offset):
+    """The day number and image of the day of players in that timezone. Doesn't touch the session, so it's the same
+    for every player in the timezone, and can be cached by proxies until the day ends there."""
+    if not display.tzahle.MIN_OFFSET <= offset <= display.tzahle.MAX_OFFSET:
+        return 'invalid offset', 400
+    date, day_end = display.tzahle.player_day(offset)
+    day = display.tzahle.get_day_by_date(date)
+    if day is None:
+        return 'no tag for this day', 400
+    day.prepare()
+    response = app.response_class(day.offset_body, mimetype='application/json')
+    response.cache_control.public = True
+    response.cache_control.max_age = max(int((day_end - datetime.datetime.now(datetime.timezone.utc)).total_seconds()), 0)
+    response.expires = day_end
+    return response
 
 
 @app.route('/quiz', methods=['GET', 'POST'])
@@ -103,27 +389,67 @@ def quiz():
             return 'bad path', 400
         answer_dict = build_answer_response(tag, score=sess_score())
 
-        guess = sanitize_guess(request.data)
+        guess = matching.sanitize_guess(request.data)
 
         if guess == 'giveup':
+            metrics.registry.inc('guesses_total', (('game', 'quiz'), ('outcome', 'giveup')))
             return answer_dict
 
         sess_guesses(add=guess)
 
-        if guess in tag.alt_names:
+        if matching.is_answer(tag, guess, app.config['FUZZY_MATCHING']):
+            metrics.registry.inc('guesses_total', (('game', 'quiz'), ('outcome', 'correct')))
             answer_dict['score'] += 1
             sess_score(answer_dict['score'])
             return answer_dict
         else:
+            metrics.registry.inc('guesses_total', (('game', 'quiz'), ('outcome', 'incorrect')))
             return 'incorrect'
 
 
+@app.route('/quiz/queue')
+def quiz_queue():
+    """Returns the next quiz tags for the player, as a JSON list (key: tags) of their image URLs (key: image) and
+    opaque tokens (key: token), so the player can load the images ahead and move to a tag by posting its token to
+    /quiz/next. The count argument sets how many tags to send. A batch never repeats a tag."""
+    count = request.args.get('count', app.config['QUIZ_QUEUE_BATCH_SIZE'], type=int)
+    if not 0 < count <= app.config['QUIZ_QUEUE_MAX_BATCH_SIZE']:
+        return 'invalid count', 400
+    queue = sess_queue()
+    # A player who keeps asking for tags without playing them doesn't get to grow their queue without bounds
+    if len(queue) + count > 2 * app.config['QUIZ_QUEUE_MAX_BATCH_SIZE']:
+        guesses_store.clear(sess_id(), 'quiz_queue')
+    tags = []
+    for tag in display.quiz.random_tags(count):
+        token = secrets.token_urlsafe(8)
+        guesses_store.add(sess_id(), 'quiz_queue', f'{token} {content.build_full_path(tag)}')
+        tags.append({'token': token, 'image': content.build_full_image_path(tag)})
+    return {'tags': tags}
+
+
+@app.route('/quiz/next', methods=['POST'])
+def quiz_next():
+    """Moves the player to the tag of the token in the request body, which was given to them by /quiz/queue, the same
+    as a GET to /quiz would move them to a random tag. Every token can be used only once."""
+    token = request.data.decode('utf-8').strip()
+    queue = sess_queue()
+    if token not in queue:
+        return 'bad token', 400
+    tag_path = queue.pop(token)
+    guesses_store.clear(sess_id(), 'quiz_queue')
+    for other_token, other_path in queue.items():
+        guesses_store.add(sess_id(), 'quiz_queue', f'{other_token} {other_path}')
+    sess_guesses(clear=True)
+    sess_tag_path(tag_path)
+    return 'ok'
+
+
 @app.route('/quiz/objection', methods=['POST'])
 def quiz_objection():
     """Sent when a quiz player thinks their guess(es) should be accepted as a valid answer.
     Uses the session to find out what the player's guesses were for what tag. No request body needed.
     The response body has a short explanation of the error if one occurred."""
-    if 'tag_path' not in session or 'guesses' not in session:
+    if 'tag_path' not in session or 'id' not in session:
         return 'no session', 400
     tag_path = sess_tag_path()
     guesses = sess_guesses()
@@ -132,21 +458,37 @@ def quiz_objection():
         return 'bad path', 400
     if len(guesses) == 0:
         return 'no guesses', 400
-    with open(os.path.join(app.root_path, 'objections.csv'), "a", encoding='utf-8', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow((tag_path, unit_tag.name, ';'.join(guesses)))
+    # A round is objected over once, objecting again changes nothing
+    if tag_path in guesses_store.get(sess_id(), 'quiz_objection'):
+        return 'accepted', 200
+    guesses_store.add(sess_id(), 'quiz_objection', tag_path)
+    # Guesses become aliases only once enough different players objected over them, see objection_aliases.py. Stored
+    # by a hash of the session ID rather than the ID itself.
+    objector = hashlib.blake2b(sess_id().encode('utf-8'), digest_size=8).hexdigest()
+    objections.add((tag_path, unit_tag.name, ';'.join(guesses), objector))
     return 'accepted', 200
 
 
+def sess_id() -> str:
+    """The player's session ID, which their guesses are stored by. Created on first use."""
+    if 'id' not in session:
+        session['id'] = secrets.token_urlsafe(16)
+    return session['id']
+
+
 def sess_guesses(add=None, clear=None):
     if clear:
-        session['guesses'] = []
+        guesses_store.clear(sess_id(), 'quiz')
+        guesses_store.clear(sess_id(), 'quiz_objection')
     elif not add:
-        return session.get('guesses', [])
+        return guesses_store.get(sess_id(), 'quiz')
     else:
-        guesses = session.get('guesses') or []
-        guesses += [add]
-        session['guesses'] = guesses
+        guesses_store.add(sess_id(), 'quiz', add)
+
+
+def sess_queue() -> dict[str, str]:
+    """The player's upcoming quiz tags, token -> tag path, in the order they were sent"""
+    return dict(entry.split(' ', 1) for entry in guesses_store.get(sess_id(), 'quiz_queue'))
 
 
 def sess_tag_path(new=None):
@@ -0,0 +1,46 @@
+"""Content hashes of static files, added to their URLs so browsers can cache them forever. A changed file gets a new
+URL, so a stale copy is never used. Every file is hashed once, the first time a URL to it is built."""
+import hashlib
+import os
+import threading
+from typing import Union
+
+from werkzeug.security import safe_join
+
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# Query argument holding the hash in static URLs
+VERSION_ARG = 'v'
+# A year, the longest max-age that's commonly respected
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Static file path -> its hash, or None if there's no such file
+fingerprints: dict[str, Union[str, None]] = {}
+lock = threading.Lock()
+
+
+def fingerprint(filename: str) -> Union[str, None]:
+    """Short hash of the static file's content, or None if it doesn't exist"""
+    if filename in fingerprints:
+        return fingerprints[filename]
+    path = safe_join(STATIC_PATH, filename)
+    digest = None
+    if path is not None and os.path.isfile(path):
+        with open(path, 'rb') as file:
+            digest = hashlib.blake2b(file.read(), digest_size=8).hexdigest()
+    with lock:
+        fingerprints[filename] = digest
+    return digest
+
+
+def build_manifest() -> dict[str, str]:
+    """Hashes every static file ahead of time, returning them all"""
+    for directory, _, files in os.walk(STATIC_PATH):
+        for name in files:
+            fingerprint(os.path.relpath(os.path.join(directory, name), STATIC_PATH).replace(os.sep, '/'))
+    return {filename: digest for filename, digest in fingerprints.items() if digest is not None}
+
+
+def invalidate():
+    """Drops all hashes. Must be called when static files change while the app is running."""
+    with lock:
+        fingerprints.clear()
@@ -0,0 +1,16 @@
+"""Offline benchmarks for the site. Every module here can be run with python -m benchmarks.<module>"""
+import timeit
+from typing import Callable
+
+
+def measure(func: Callable[[], object], number: int = 1000, repeat: int = 5) -> float:
+    """Returns the best time of a single call to func, in microseconds"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def report(name: str, before: float, after: float):
+    print(f'{name:<40} {before:>10.2f}us {after:>10.2f}us {before / after:>8.1f}x')
+
+
+def report_header():
+    print(f'{"":<40} {"before":>12} {"after":>12} {"speedup":>9}')
@@ -0,0 +1,46 @@
+"""Compares checking /tzahle guesses by scanning every alt name to using the tag's matcher."""
+import content
+import matching
+from benchmarks import measure, report, report_header
+
+
+def scan_guess(tag: content.Symbol, guess: str):
+    """The /tzahle guess check as it was before matchers, scanning every alt name for every word"""
+    if guess in tag.alt_names:
+        return True
+    guess_words = guess.split(" ")
+    return list(set([str(i) for i in range(len(guess_words)) for name in tag.alt_names if guess_words[i] in name]))
+
+
+def match_guess(tag: content.Symbol, guess: str):
+    matcher = matching.get_matcher(tag)
+    if matcher.is_answer(guess):
+        return True
+    return matcher.hint_indices(guess.split(" "))
+
+
+def main():
+    # The tag with the most alt names, the worst case for scanning
+    largest = max(content.get_all_unit_tags(), key=lambda tag: len(tag.alt_names))
+    smallest = min(content.get_all_unit_tags(), key=lambda tag: len(tag.alt_names))
+    wrong_guess = 'חטיבת הגולן הצפונית 474 של פיקוד'
+    right_guess = next(iter(largest.alt_names))
+    assert sorted(scan_guess(largest, wrong_guess)) == match_guess(largest, wrong_guess)
+
+    report_header()
+    report(f'hint, {len(largest.alt_names)} alt names',
+           measure(lambda: scan_guess(largest, wrong_guess)),
+           measure(lambda: match_guess(largest, wrong_guess)))
+    report(f'hint, {len(smallest.alt_names)} alt names',
+           measure(lambda: scan_guess(smallest, wrong_guess)),
+           measure(lambda: match_guess(smallest, wrong_guess)))
+    report('exact match',
+           measure(lambda: scan_guess(largest, right_guess)),
+           measure(lambda: match_guess(largest, right_guess)))
+    # Paid once per tag, on its first hint
+    build = measure(lambda: matching.AnswerMatcher(largest.alt_names), number=10)
+    print(f'building matcher, {len(largest.alt_names)} alt names: {build:.2f}us')
+
+
+if __name__ == '__main__':
+    main()
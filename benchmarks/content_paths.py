@@ -0,0 +1,39 @@
+"""Compares walking the unit tags tree to using content.index, for the lookups done on every request."""
+import content
+from benchmarks import measure, report, report_header
+
+
+def walk_full_path(tag: content.Symbol) -> str:
+    return content.build_root_path(tag) + tag.folder
+
+
+def walk_image_path(tag: content.Symbol) -> str:
+    return content.build_root_path(tag) + tag.image_name
+
+
+def main():
+    all_tags = content.get_all_unit_tags()
+    paths = [content.build_full_path(tag) for tag in all_tags]
+    deepest = max(paths, key=lambda path: path.count('/'))
+    deepest_tag = content.find_unit_tag(deepest)
+
+    report_header()
+    report('find_unit_tag (deepest path)',
+           measure(lambda: content.walk_unit_tag(deepest)),
+           measure(lambda: content.find_unit_tag(deepest)))
+    report('build_full_path (deepest tag)',
+           measure(lambda: walk_full_path(deepest_tag)),
+           measure(lambda: content.build_full_path(deepest_tag)))
+    # What a quiz POST does: find the tag of the session's path, then build its path for the answer
+    report('quiz POST lookups',
+           measure(lambda: walk_full_path(content.walk_unit_tag(deepest))),
+           measure(lambda: content.build_full_path(content.find_unit_tag(deepest))))
+    # What a recursive listing of the root does: a link and an image for every tile
+    report(f'/dir?r tile paths ({len(all_tags)} tiles)',
+           measure(lambda: [(walk_full_path(tag), walk_image_path(tag)) for tag in all_tags], number=100),
+           measure(lambda: [(content.build_full_path(tag), content.build_image_path(tag)) for tag in all_tags],
+                   number=100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Compares rendering directory listings on every request to serving them from the response cache."""
+import app
+from benchmarks import measure, report, report_header
+
+
+def main():
+    client = app.app.test_client()
+
+    def get(url: str, **kwargs):
+        # Recursive listings are streamed, they're only rendered and cached while the body is read
+        response = client.get(url, **kwargs)
+        response.get_data()
+        response.close()
+        return response
+
+    def uncached(url: str):
+        app.dir_cache.invalidate()
+        return get(url)
+
+    report_header()
+    for url in ('/dir/commands', '/dir/forces?r', '/dir?r'):
+        report(url, measure(lambda: uncached(url), number=10), measure(lambda: get(url), number=100))
+    etag = get('/dir?r').headers['ETag']
+    report('/dir?r, If-None-Match',
+           measure(lambda: uncached('/dir?r'), number=10),
+           measure(lambda: get('/dir?r', headers={'If-None-Match': etag}), number=100))
+
+
+if __name__ == '__main__':
+    main()
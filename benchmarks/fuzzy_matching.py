@@ -0,0 +1,47 @@
+"""Compares fuzzy matching guesses by scanning every alt name in the catalog to using the fuzzy index."""
+import random
+
+import content
+import matching
+from benchmarks import measure, report, report_header
+
+
+def scan_closest(guess: str) -> tuple[int, frozenset[content.Symbol]]:
+    """FuzzyIndex.closest without the index, computing the edit distance to every alt name"""
+    index = matching.get_fuzzy_index()
+    limit = matching.max_distance(guess)
+    best = limit + 1
+    best_tags = set()
+    for name, tags in zip(index.names, index.name_tags):
+        distance = matching.edit_distance(guess, name, best)
+        if distance < best:
+            best, best_tags = distance, set(tags)
+        elif distance == best <= limit:
+            best_tags |= tags
+    return best, frozenset(best_tags)
+
+
+def typo(name: str, rand: random.Random) -> str:
+    """Removes, replaces or swaps a single letter of the name"""
+    i = rand.randrange(len(name) - 1)
+    return rand.choice((name[:i] + name[i + 1:], name[:i] + 'א' + name[i + 1:], name[:i] + name[i + 1] + name[i] + name[i + 2:]))
+
+
+def main():
+    rand = random.Random(0)
+    tags = content.get_all_unit_tags()
+    index = matching.get_fuzzy_index()
+    guesses = [(tag, typo(matching.normalize(tag.name), rand)) for tag in tags]
+    accepted = sum(index.accepts(tag, guess) for tag, guess in guesses)
+    print(f'accepted {accepted} of {len(guesses)} names with a single typo')
+
+    report_header()
+    report(f'fuzzy match, {len(guesses)} typo guesses',
+           measure(lambda: [scan_closest(guess) for _, guess in guesses], number=1, repeat=3),
+           measure(lambda: [index.closest(guess) for _, guess in guesses], number=1, repeat=3))
+    slowest = max(measure(lambda: index.accepts(tag, guess), number=10, repeat=3) for tag, guess in guesses)
+    print(f'slowest single guess: {slowest:.2f}us')
+
+
+if __name__ == '__main__':
+    main()
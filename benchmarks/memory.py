@@ -0,0 +1,53 @@
+"""Reports how much memory a worker's catalog takes, comparing the working tree to a git revision (HEAD by default):
+python -m benchmarks.memory [revision]
+Both are measured in fresh interpreters, after importing the app and processing the alt names of every tag."""
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = '''
+import gc
+import tracemalloc
+import flask
+
+
+def rss():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * {page_size}
+
+
+gc.collect()
+start_rss = rss()
+tracemalloc.start()
+import app
+import content
+for tag in content.get_all_unit_tags():
+    tag.alt_names
+gc.collect()
+print(tracemalloc.get_traced_memory()[0], rss() - start_rss)
+'''
+
+
+def measure_memory(directory: str) -> tuple[int, int]:
+    """Returns the traced allocations and RSS growth of loading the app in the given directory, in bytes"""
+    code = MEASURE.format(page_size=os.sysconf('SC_PAGE_SIZE'))
+    traced, rss = subprocess.check_output([sys.executable, '-c', code], cwd=directory).split()
+    return int(traced), int(rss)
+
+
+def main(revision: str = 'HEAD'):
+    with tempfile.TemporaryDirectory() as directory:
+        archive = subprocess.run(['git', 'archive', revision], cwd=ROOT, check=True, capture_output=True).stdout
+        subprocess.run(['tar', '-x', '-C', directory], input=archive, check=True)
+        before = measure_memory(directory)
+    after = measure_memory(ROOT)
+    print(f'{"":<40} {revision:>12} {"working tree":>12}')
+    print(f'{"allocated loading the app and catalog":<40} {before[0] / 1024:>10.0f}KB {after[0] / 1024:>10.0f}KB')
+    print(f'{"worker RSS growth":<40} {before[1] / 1024:>10.0f}KB {after[1] / 1024:>10.0f}KB')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
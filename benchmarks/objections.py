@@ -0,0 +1,31 @@
+"""Compares writing an objection by opening the file on every request, as it used to, to adding it to the sink."""
+import csv
+import os
+import tempfile
+
+import objection_sink
+from benchmarks import measure, report, report_header
+
+ROW = ('commands/north/galil/baram', 'עוצבת ברעם (חטיבה 300)', 'חטיבת ברעם;ברעם')
+
+
+def append_row(path: str):
+    with open(path, 'a', encoding='utf-8', newline='') as file:
+        csv.writer(file).writerow(ROW)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        sink = objection_sink.ObjectionSink(os.path.join(directory, 'sink.csv'))
+        report_header()
+        report('objection write per request',
+               measure(lambda: append_row(os.path.join(directory, 'direct.csv'))),
+               measure(lambda: sink.add(ROW)))
+        sink.close()
+        stats = sink.stats()
+        print(f'{stats["flushes"]} flushes of {stats["rows_written"]} rows, '
+              f'{stats["mean_flush_latency"] * 1e6:.2f}us mean flush latency')
+
+
+if __name__ == '__main__':
+    main()
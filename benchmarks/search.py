@@ -0,0 +1,45 @@
+"""Compares searching the catalog by scanning every name to searching the sorted index, for queries of every length
+taken from the names themselves."""
+import random
+
+import content
+import search
+from benchmarks import measure, report, report_header
+
+
+def scan(query: str, limit: int = 10) -> list[tuple[content.Symbol, str]]:
+    """Search without an index, normalizing and checking every word of every name on every call"""
+    query = search.normalize(query)
+    found = {}
+    for tag, path in search.get_search_index().tags:
+        for name in {search.normalize(name) for name in (tag.name, *tag.alt_names)}:
+            words = name.split(' ')
+            for i in range(len(words)):
+                if ' '.join(words[i:]).startswith(query):
+                    rank = (i != 0 or name != query, i != 0, len(name))
+                    if path not in found or rank < found[path][0]:
+                        found[path] = rank, tag
+    return [(found[path][1], path) for path in sorted(found, key=lambda path: (found[path][0], path))][:limit]
+
+
+def main():
+    index = search.get_search_index()
+    names = [search.normalize(tag.name) for tag, _ in index.tags]
+    random.seed(0)
+    queries = {length: [name[:length] for name in random.sample(names, 50) if len(name) >= length]
+               for length in (1, 3, 6, 12)}
+    for length_queries in queries.values():
+        for query in length_queries:
+            assert [path for _, path in scan(query)] == [path for _, path in index.search(query)], query
+
+    build = measure(lambda: search.SearchIndex(content.index), number=1)
+    print(f'{len(index.keys)} keys of {len(index.tags)} tags, built in {build / 1000:.1f}ms')
+    report_header()
+    for length, length_queries in queries.items():
+        report(f'{length} chars',
+               measure(lambda: [scan(query) for query in length_queries], number=1) / len(length_queries),
+               measure(lambda: [index.find(query, 10) for query in length_queries], number=10) / len(length_queries))
+
+
+if __name__ == '__main__':
+    main()
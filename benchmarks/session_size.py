@@ -0,0 +1,25 @@
+"""Compares signing a session holding the player's guess list, as it used to, to one holding only their session ID."""
+import secrets
+
+from app import app
+from benchmarks import measure, report, report_header
+
+
+def main():
+    serializer = app.session_interface.get_signing_serializer(app)
+    base = {'tag_path': 'commands/north/galil/baram', 'score': 12}
+    after = {**base, 'id': secrets.token_urlsafe(16)}
+    counts = (1, 10, 100)
+    befores = {count: {**base, 'guesses': [f'חטיבת ברעם {i}' for i in range(count)]} for count in counts}
+    for count, before in befores.items():
+        print(f'cookie size, {count} guesses: {len(serializer.dumps(before))} bytes before, '
+              f'{len(serializer.dumps(after))} bytes after')
+    report_header()
+    for count, before in befores.items():
+        report(f'sign and load cookie, {count} guesses',
+               measure(lambda: serializer.loads(serializer.dumps(before))),
+               measure(lambda: serializer.loads(serializer.dumps(after))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""Load tests every route and micro-benchmarks the content hot paths, reporting p50/p99 latency and throughput.
+Routes are driven through the Flask test client, and with --gunicorn through a local gunicorn at the given concurrency
+as well. Results can be saved as JSON and compared to the results of another commit:
+python -m benchmarks.suite --output before.json
+python -m benchmarks.suite --compare before.json
+Guesses and objections go to a temporary directory. Tzahle routes need a Tzahle schedule, and are skipped without one."""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, NamedTuple, Union
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEEP_PATH = 'forces/air/bases/hatzerim/hammers'
+WRONG_GUESS = 'חטיבת בדיקה 999'
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    body: Union[bytes, None] = None
+
+
+class Route(NamedTuple):
+    name: str
+    request: Request
+    # Sent once per client before measuring, to put the session in the state the request needs
+    setup: tuple[Request, ...] = ()
+    tzahle: bool = False
+
+
+ROUTES = (
+    Route('GET /', Request('GET', '/')),
+    Route('GET /dir/commands', Request('GET', '/dir/commands')),
+    Route('GET /dir?r', Request('GET', '/dir?r')),
+    Route('GET /quiz', Request('GET', '/quiz')),
+    Route('POST /quiz', Request('POST', '/quiz', WRONG_GUESS.encode('utf-8')), (Request('GET', '/quiz'),)),
+    Route('POST /quiz/objection', Request('POST', '/quiz/objection'),
+          (Request('GET', '/quiz'), Request('POST', '/quiz', WRONG_GUESS.encode('utf-8')))),
+    Route('GET /tzahle', Request('GET', '/tzahle'), tzahle=True),
+    Route('POST /tzahle/offset', Request('POST', '/tzahle/offset', b'-180'), tzahle=True),
+    Route('GET /tzahle/offset/-180', Request('GET', '/tzahle/offset/-180'), tzahle=True),
+    Route('POST /tzahle', Request('POST', '/tzahle', WRONG_GUESS.encode('utf-8')),
+          (Request('POST', '/tzahle/offset', b'-180'),), tzahle=True),
+)
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    """Latencies in seconds, summarized in microseconds"""
+    latencies = sorted(latencies)
+    return {'requests': len(latencies),
+            'errors': errors,
+            'p50_us': latencies[len(latencies) // 2] * 1e6,
+            'p99_us': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1e6,
+            'throughput': len(latencies) / elapsed}
+
+
+def run_test_client(routes: list[Route], count: int) -> dict[str, dict]:
+    """Sends every route's request count times in a row, after a warm-up, through the Flask test client"""
+    import app
+
+    results = {}
+    for route in routes:
+        client = app.app.test_client()
+        for setup in route.setup:
+            client.open(setup.path, method=setup.method, data=setup.body)
+
+        def send() -> int:
+            response = client.open(route.request.path, method=route.request.method, data=route.request.body)
+            # Streamed responses are only rendered while their body is read
+            response.get_data()
+            response.close()
+            return response.status_code
+
+        for _ in range(min(count, 20)):
+            send()
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            request_start = time.perf_counter()
+            errors += send() >= 400
+            latencies.append(time.perf_counter() - request_start)
+        results[route.name] = summarize(latencies, time.perf_counter() - start, errors)
+    return results
+
+
+class Connection:
+    """A keep-alive connection to the server, keeping the session cookie like a browser would"""
+
+    def __init__(self, port: int):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.cookie = None
+
+    def send(self, request: Request) -> int:
+        headers = {'Content-Type': 'text/plain;charset=UTF-8'}
+        if self.cookie is not None:
+            headers['Cookie'] = self.cookie
+        self.connection.request(request.method, request.path, request.body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie is not None:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(port: int, workers: int, env: dict[str, str]) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind',
+                               f'127.0.0.1:{port}', '--log-level', 'warning', 'wsgi:app'],
+                              cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {server.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('gunicorn did not start listening in time')
+
+
+def run_gunicorn(routes: list[Route], count: int, concurrency: int, workers: int, env: dict[str, str]) -> dict:
+    """Sends every route's request count times in total, from concurrency clients at once, to a local gunicorn"""
+    port = free_port()
+    server = start_gunicorn(port, workers, env)
+    try:
+        results = {}
+        for route in routes:
+            connections = [Connection(port) for _ in range(concurrency)]
+            for connection in connections:
+                for setup in route.setup:
+                    connection.send(setup)
+                connection.send(route.request)
+            lock = threading.Lock()
+            latencies = []
+            errors = 0
+
+            def client(connection: Connection, requests: int):
+                nonlocal errors
+                own = []
+                own_errors = 0
+                for _ in range(requests):
+                    request_start = time.perf_counter()
+                    own_errors += connection.send(route.request) >= 400
+                    own.append(time.perf_counter() - request_start)
+                with lock:
+                    latencies.extend(own)
+                    errors += own_errors
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                for i, connection in enumerate(connections):
+                    executor.submit(client, connection, count // concurrency + (i < count % concurrency))
+            results[route.name] = summarize(latencies, time.perf_counter() - start, errors)
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run_micro(count: int) -> dict[str, dict]:
+    """Times single calls of the functions every request goes through"""
+    # Imported for content's functions to be timed as the app wraps them
+    import app
+    import content
+    import matching
+
+    tag = content.find_unit_tag(DEEP_PATH)
+    matcher = matching.get_matcher(tag)
+    guess_words = matching.sanitize_guess('טייסת הפטישים 999'.encode('utf-8')).split(' ')
+    benchmarks: dict[str, Callable[[], object]] = {
+        'find_unit_tag': lambda: content.find_unit_tag(DEEP_PATH),
+        'build_full_path': lambda: content.build_full_path(tag),
+        'get_all_unit_tags': lambda: content.get_all_unit_tags(),
+        'sanitize_guess': lambda: matching.sanitize_guess(' טייסת  "הפטישים" (69) '.encode('utf-8')),
+        'hint_indices': lambda: matcher.hint_indices(guess_words),
+    }
+    results = {}
+    for name, func in benchmarks.items():
+        for _ in range(min(count, 1000)):
+            func()
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(count):
+            call_start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - call_start)
+        results[name] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def has_tzahle_schedule() -> bool:
+    import display.tzahle
+
+    try:
+        display.tzahle.init_if_needed()
+        return display.tzahle.get_day_by_date() is not None
+    except (OSError, ValueError):
+        return False
+
+
+def git_commit() -> Union[str, None]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: dict, previous: Union[dict, None]):
+    for section, section_results in results['results'].items():
+        print(f'\n{section}')
+        print(f'{"":<28} {"requests":>9} {"errors":>7} {"p50":>11} {"p99":>11} {"per second":>11}', end='')
+        print(f' {"p50 before":>11} {"change":>7}' if previous else '')
+        for name, result in section_results.items():
+            print(f'{name:<28} {result["requests"]:>9} {result["errors"]:>7} {result["p50_us"]:>9.1f}us '
+                  f'{result["p99_us"]:>9.1f}us {result["throughput"]:>11.0f}', end='')
+            before = (previous or {}).get('results', {}).get(section, {}).get(name)
+            if before is not None:
+                print(f' {before["p50_us"]:>9.1f}us {result["p50_us"] / before["p50_us"] - 1:>+7.0%}')
+            else:
+                print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route')
+    parser.add_argument('--calls', type=int, default=20000, help='Calls per micro-benchmark')
+    parser.add_argument('--gunicorn', action='store_true', help='Load test a local gunicorn as well')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent gunicorn clients')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--output', help='Save the results as JSON to this path')
+    parser.add_argument('--compare', help='Compare to results saved by an earlier run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Set before importing the app, so the runs' guesses and objections don't end up with the real ones
+        env = {**os.environ,
+               'GUESS_STORE_PATH': os.path.join(directory, 'guesses.db'),
+               'OBJECTIONS_PATH': os.path.join(directory, 'objections.csv')}
+        os.environ.update(env)
+        routes = list(ROUTES)
+        if not has_tzahle_schedule():
+            print('No Tzahle schedule, skipping the Tzahle routes')
+            routes = [route for route in routes if not route.tzahle]
+
+        results = {'commit': git_commit(),
+                   'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                   'python': platform.python_version(),
+                   'options': vars(args),
+                   'results': {'micro': run_micro(args.calls),
+                               'test client': run_test_client(routes, args.requests)}}
+        if args.gunicorn:
+            results['results'][f'gunicorn, {args.workers} workers, {args.concurrency} clients'] = \
+                run_gunicorn(routes, args.requests, args.concurrency, args.workers, env)
+        # Written while the temporary directory is still there, rather than when exiting
+        import app
+        app.objections.flush()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            previous = json.load(file)
+        print(f'Comparing to {previous.get("commit")} from {previous.get("time")}')
+    print_results(results, previous)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
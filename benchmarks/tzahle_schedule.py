@@ -0,0 +1,24 @@
+"""Compares looking up a day's tag in the generated Tzahle schedule to indexing the shuffled tag list.
+The schedule itself is checked by tests/test_schedule.py."""
+import random
+import secrets
+
+import content
+import schedule
+from benchmarks import measure, report, report_header
+
+DAYS = 20000
+
+
+def main():
+    paths = sorted({content.build_full_path(tag) for tag in content.get_all_unit_tags()})
+    generated = schedule.TagSchedule(secrets.token_bytes(16), [(path, 0) for path in paths])
+    tag_list = list(paths)
+    random.shuffle(tag_list)
+    report_header()
+    report('tag of a day', measure(lambda: tag_list[random.randrange(len(tag_list))]),
+           measure(lambda: generated.tag(random.randrange(DAYS))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""Compares recursively building get_all_unit_tags listings to using the cached listings."""
+from collections import deque
+import random
+
+import content
+from benchmarks import measure, report, report_header
+
+
+def walk_unit_tags(group: content.Group = content.unit_tags) -> list[content.Symbol]:
+    """get_all_unit_tags as it was before caching, recursing over the tree on every call"""
+    if not group.is_group:
+        return list(group)
+    ret = deque()
+    for child in reversed(group.children.values()):
+        if child.parent != group:
+            continue
+        if isinstance(child, content.Group):
+            ret.extendleft(reversed(walk_unit_tags(child)))
+        elif child.is_unit:
+            ret.appendleft(child)
+    if group.is_unit:
+        ret.appendleft(group)
+    return list(ret)
+
+
+def main():
+    forces = content.find_unit_tag('forces')
+    assert walk_unit_tags() == list(content.get_all_unit_tags())
+    assert walk_unit_tags(forces) == list(content.get_all_unit_tags(forces))
+
+    report_header()
+    report('get_all_unit_tags (root)',
+           measure(lambda: walk_unit_tags(), number=100),
+           measure(lambda: content.get_all_unit_tags()))
+    report('get_all_tags_in_path (forces)',
+           measure(lambda: walk_unit_tags(content.find_unit_tag('forces')), number=100),
+           measure(lambda: content.get_all_tags_in_path('forces')))
+    # What every /quiz GET does through display.quiz.random_tag
+    report('random quiz tag',
+           measure(lambda: random.choice(walk_unit_tags()), number=100),
+           measure(lambda: random.choice(content.get_all_unit_tags())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Reports how much of gunicorn's workers' memory is shared with the master and how much is their own, with the app
+preloaded by the master (see gunicorn.conf.py) and without, for every number of workers:
+python -m benchmarks.worker_memory --workers 1 2 4
+Every worker is sent requests to every route before measuring, as it would be after serving for a while. The total is
+the proportional set size of the master and the workers, which counts pages shared by n processes as 1/n in each, so
+when memory is shared it grows by only about a worker's private memory per worker. Linux only, read from /proc."""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.suite import ROUTES, Connection, Request, Route, free_port, start_gunicorn
+
+# smaps_rollup fields, in KB
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def memory(pid: int) -> dict[str, int]:
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup', encoding='utf-8') as file:
+        for line in file:
+            name, _, rest = line.partition(':')
+            if name in FIELDS:
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def children(pid: int) -> list[int]:
+    found = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', encoding='utf-8') as file:
+                # The command can have spaces and parentheses, the parent PID is the second field after it
+                parent = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == pid:
+            found.append(int(name))
+    return found
+
+
+def measure(workers: int, preload: bool, requests: int, env: dict[str, str]) -> dict:
+    port = free_port()
+    server = start_gunicorn(port, workers, {**env, 'GUNICORN_PRELOAD': '1' if preload else '0'})
+    try:
+        # Every request opens a new connection, so they're spread among the workers
+        for route in (*ROUTES, Route('GET /search', Request('GET', '/search?q=%D7%98%D7%99%D7%99%D7%A1%D7%AA'))):
+            for _ in range(requests * workers):
+                connection = Connection(port)
+                for request in (*route.setup, route.request):
+                    connection.send(request)
+                connection.connection.close()
+        time.sleep(1)
+        master = memory(server.pid)
+        worker_memory = [memory(pid) for pid in children(server.pid)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {'master_pss': master['Pss'],
+            'worker_rss': sum(values['Rss'] for values in worker_memory) / len(worker_memory),
+            'worker_shared': sum(values['Shared_Clean'] + values['Shared_Dirty']
+                                 for values in worker_memory) / len(worker_memory),
+            'worker_private': sum(values['Private_Clean'] + values['Private_Dirty']
+                                  for values in worker_memory) / len(worker_memory),
+            'total_pss': master['Pss'] + sum(values['Pss'] for values in worker_memory)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Numbers of workers to measure')
+    parser.add_argument('--requests', type=int, default=5, help='Requests per route per worker before measuring')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ,
+               'GUESS_STORE_PATH': os.path.join(directory, 'guesses.db'),
+               'OBJECTIONS_PATH': os.path.join(directory, 'objections.csv'),
+               'METRICS_DIR': os.path.join(directory, 'metrics')}
+        print(f'{"":<22} {"master PSS":>11} {"worker RSS":>11} {"shared":>11} {"private":>11} {"total PSS":>11}')
+        for preload in (False, True):
+            for workers in args.workers:
+                result = measure(workers, preload, args.requests, env)
+                print(f'{"preloaded" if preload else "not preloaded":<13} {workers:>2} workers '
+                      f'{result["master_pss"] / 1024:>9.1f}MB {result["worker_rss"] / 1024:>9.1f}MB '
+                      f'{result["worker_shared"] / 1024:>9.1f}MB {result["worker_private"] / 1024:>9.1f}MB '
+                      f'{result["total_pss"] / 1024:>9.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Reloads the unit tags catalog when content.py changes, while the app keeps serving.
+The new tree is built by a separate process into a snapshot (see snapshot.py), so building it doesn't compete with
+requests over this process' GIL. It's then loaded from the snapshot in a background thread, along with everything
+derived from it, and only then swapped in as a whole, so requests see either the old catalog or the new one, and
+never build anything for it themselves."""
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from typing import Callable, Iterable, Union
+
+import content
+import matching
+import snapshot
+
+# Snapshots are named by the hash of the content.py they were built from, so workers reloading the same content.py
+# build it only once
+SNAPSHOT_DIR = tempfile.gettempdir()
+
+# Hash of the content.py the current catalog was built from
+loaded_hash = snapshot.source_hash()
+reload_lock = threading.Lock()
+
+
+def build_snapshot(source_hash: bytes) -> str:
+    """Builds a snapshot of content.py in a separate process, unless one was built already. Returns its path."""
+    path = os.path.join(SNAPSHOT_DIR, f'tzahle-catalog-{source_hash.hex()[:16]}.snapshot')
+    if not os.path.exists(path):
+        temporary = f'{path}.{os.getpid()}.tmp'
+        subprocess.run([sys.executable, '-m', 'snapshot', 'build', temporary],
+                       cwd=os.path.dirname(snapshot.SOURCE_PATH), check=True, capture_output=True)
+        os.replace(temporary, path)
+    return path
+
+
+def load(path: str, version: int) -> content.Catalog:
+    loaded = snapshot.Snapshot(path)
+    try:
+        if not loaded.is_current():
+            raise ValueError('content.py changed while its snapshot was built')
+        return content.Catalog(loaded.build_tree(), version)
+    finally:
+        # The tree holds no references into the mapping
+        loaded.close()
+
+
+def prepare(new: content.Catalog, aliases_path: str):
+    """Builds in the new catalog everything the current one has built, after adding the aliases to its tags.
+    Raises if any of it can't be built for the new tree, such as a Tzahle schedule with a tag that was removed."""
+    # Requests keep adding to the current catalog's structures meanwhile, so they're copied first
+    derived = list(content.catalog.derived)
+    # Matchers are built per tag, on the tag's first hint. Build those the current catalog has, and only those, so
+    # requests don't build them again.
+    matcher_paths = [content.build_full_path(tag) for tag in list(content.catalog.derived.get('matchers', ()))]
+    token = content.building.set(new)
+    try:
+        matching.load_aliases(aliases_path)
+        content.get_all_unit_tags()
+        for name in derived:
+            builder = content.derived_builders.get(name)
+            if builder is not None:
+                content.get_derived(name, builder)
+        for path in matcher_paths:
+            tag = content.find_unit_tag(path)
+            # The tag might have been removed
+            if tag is not None:
+                matching.get_matcher(tag)
+    finally:
+        content.building.reset(token)
+
+
+def reload(aliases_path: str, on_swap: Iterable[Callable[[], None]] = ()) -> bool:
+    """Reloads the catalog if content.py changed since it was loaded, calling the callbacks after swapping it in.
+    Returns whether it was reloaded."""
+    global loaded_hash
+    with reload_lock:
+        source_hash = snapshot.source_hash()
+        if source_hash == loaded_hash:
+            return False
+        new = load(build_snapshot(source_hash), content.catalog.version + 1)
+        prepare(new, aliases_path)
+        content.swap(new)
+        loaded_hash = source_hash
+    for callback in on_swap:
+        callback()
+    return True
+
+
+class Watcher:
+    """Checks whether content.py changed every interval seconds, from a background thread, and reloads if it did"""
+
+    def __init__(self, interval: float, aliases_path: str, on_swap: Iterable[Callable[[], None]] = ()):
+        self.interval = interval
+        self.aliases_path = aliases_path
+        self.on_swap = tuple(on_swap)
+        # Started on the first request, so no thread is lost to forking workers
+        self.thread: Union[threading.Thread, None] = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='catalog-reload', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                reload(self.aliases_path, self.on_swap)
+            except Exception as e:
+                # Such as a syntax error in content.py, the current catalog is kept until it's fixed
+                warnings.warn(f'Reloading the catalog failed, keeping the current one: {e!r}')
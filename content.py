@@ -1,12 +1,17 @@
 import typing
+from contextvars import ContextVar
 from functools import reduce
 from itertools import product
 import re
-from collections import deque, OrderedDict
-from typing import Union
+import sys
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Callable, TypeVar, Union
 
 from flask import url_for
 
+import images
+
 final_letters_pattern = re.compile('("[ץךףןם])')
 final_trans = str.maketrans('ץךףןם', 'צכפנמ')
 
@@ -17,7 +22,7 @@ def alt_name_processor(alt_names: list[str]):
     for name in alt_names:
         # Find acronyms ending with a final letter and add alternative with a regular letter
         # Doesn't work in reverse
-        finals_match = re.search(final_letters_pattern, name)
+        finals_match = final_letters_pattern.search(name)
         if finals_match:
             # Perhaps it's a name with multiple acronyms
             for group in finals_match.groups():
@@ -31,17 +36,74 @@ def alt_name_processor(alt_names: list[str]):
     return alt_names
 
 
+IS_UNIT = 1
+IS_ROOT = 2
+IS_GROUP = 4
+
+
 class Symbol:
+    # Slots instead of a dict per tag, as the catalog has hundreds of tags in every worker. The is_* flags are packed
+    # into a single int, and the alt names are processed only when first needed, see the alt_names property.
+    __slots__ = ('parent', 'name', 'raw_alt_names', 'processed_alt_names', 'image_name', 'folder', 'flags')
     folder: str
 
     def __init__(self, name: str, alt_names: list[str], image_name: str):
         self.parent = None
-        self.name = name
-        self.alt_names = {name, *alt_name_processor(alt_names)}  # A set because repeats are unwanted
-        self.image_name = image_name
-        self.is_unit = True
-        self.is_root = False
-        self.is_group = False
+        self.name = sys.intern(name)
+        self.raw_alt_names = alt_names
+        self.processed_alt_names = None
+        self.image_name = sys.intern(image_name)
+        self.flags = IS_UNIT
+
+    @property
+    def alt_names(self) -> set[str]:
+        """All names accepted for the tag, including those alt_name_processor adds. Processed on first access rather
+        than when building the tree, so importing this module doesn't process the alt names of every tag.
+        The raw alt names are dropped once processed. Threads processing them at once each process their own copy,
+        and one of the equal sets ends up kept. A thread finding them already dropped uses the set kept before."""
+        processed = self.processed_alt_names
+        if processed is None:
+            raw = self.raw_alt_names
+            if raw is None:
+                return self.processed_alt_names
+            # A set because repeats are unwanted
+            processed = {self.name, *map(sys.intern, alt_name_processor(list(raw)))}
+            # Set before dropping the raw alt names, so a thread finding them dropped finds this set
+            self.processed_alt_names = processed
+            self.raw_alt_names = None
+        return processed
+
+    @alt_names.setter
+    def alt_names(self, alt_names: set[str]):
+        self.processed_alt_names = alt_names
+        self.raw_alt_names = None
+
+    def set_flag(self, flag: int, value: bool):
+        self.flags = self.flags | flag if value else self.flags & ~flag
+
+    @property
+    def is_unit(self) -> bool:
+        return bool(self.flags & IS_UNIT)
+
+    @is_unit.setter
+    def is_unit(self, value: bool):
+        self.set_flag(IS_UNIT, value)
+
+    @property
+    def is_root(self) -> bool:
+        return bool(self.flags & IS_ROOT)
+
+    @is_root.setter
+    def is_root(self, value: bool):
+        self.set_flag(IS_ROOT, value)
+
+    @property
+    def is_group(self) -> bool:
+        return bool(self.flags & IS_GROUP)
+
+    @is_group.setter
+    def is_group(self, value: bool):
+        self.set_flag(IS_GROUP, value)
 
     def asdict(self):
         return {'name': self.name, 'alt_names': self.alt_names, 'image_name': self.image_name}
@@ -60,21 +122,26 @@ class Symbol:
             return self is None or self.is_root
         return self is other
 
+    # Symbols are compared by identity, hash them the same way so they can be used as dictionary keys
+    __hash__ = object.__hash__
+
 
 class Group(Symbol):
+    __slots__ = ('children', 'symbols')
+
     def __init__(self, name: str, alt_names: list[str], image_name: str, children: dict[str, Symbol], is_unit=True,
                  is_root=False):
         super().__init__(name, alt_names, image_name)
         self.children = {}
         for folder, child in children.items():
-            self.children |= {folder: child}
+            self.children[sys.intern(folder)] = child
             if isinstance(child, Group) and not child.is_unit:
                 self.children |= child.children
         self.is_unit = is_unit
         self.is_root = is_root
-        self.symbols = [*([] if is_root or not is_unit else [ParentSymbol(self)]), *self.children.values()]
+        self.symbols = (*(() if is_root or not is_unit else (ParentSymbol(self),)), *self.children.values())
         for folder, child in children.items():
-            child.folder = folder
+            child.folder = sys.intern(folder)
             if child.parent is None and not is_root:
                 child.parent = self
             # Supply all group children's ParentSymbol with its information
@@ -92,11 +159,16 @@ class Group(Symbol):
 
 class ParentSymbol(Symbol):
     """Holds a group as a symbol."""
+    __slots__ = ('group',)
+
     def __init__(self, group: Group):
         super().__init__(group.name, [], group.image_name)
         self.group = group
+
+    @property
+    def alt_names(self) -> set[str]:
         # Prevent processing alt_names again
-        self.alt_names = group.alt_names
+        return self.group.alt_names
 
 
 def as_singleton_tuple(var):
@@ -706,10 +778,19 @@ def find_unit_tag(path: str, joiner='/') -> Union[Symbol, Group, None]:
     object, or None if not found. Can return both groups and symbols, using the same syntax."""
     # None or empty paths mean root
     if path is None or path == '':
-        return unit_tags
+        return current().unit_tags
+    if joiner == '/':
+        return current().index.find(path)
+    return walk_unit_tag(path, joiner)
+
+
+def walk_unit_tag(path: str, joiner='/') -> Union[Symbol, Group, None]:
+    """Same as find_unit_tag, but walks the children of each group in the path instead of using the index."""
+    ret = current().unit_tags
+    if path is None or path == '':
+        return ret
 
     paths = path.split(joiner)
-    ret = unit_tags
     try:
         for folder in paths:
             if folder != '':
@@ -734,51 +815,225 @@ def build_root_path(tag: Symbol, joiner='/') -> str:
 
 
 def build_image_path(tag: Symbol, joiner='/') -> str:
+    if joiner == '/':
+        # Tags outside the current tree, such as those of the tree before a reload, aren't in the index
+        path = current().index.image_paths.get(tag)
+        if path is not None:
+            return path
     return build_root_path(tag, joiner) + tag.image_name
 
 
 def build_full_path(tag: Symbol, joiner='/') -> str:
+    if joiner == '/':
+        path = current().index.paths.get(tag)
+        if path is not None:
+            return path
     return build_root_path(tag, joiner) + tag.folder
 
 
-def build_full_image_path(tag: Symbol) -> str:
-    return url_for('static', filename='units/' + build_image_path(tag))
+def build_full_image_path(tag: Symbol, size: int = None, fmt: str = None) -> str:
+    """URL of the tag's image. Given a size and format, the URL of that derivative of the image, if it was built,
+    and otherwise of the original image."""
+    image_path = build_image_path(tag)
+    if size is not None and fmt is not None:
+        derived = images.find_derived(image_path, size, fmt)
+        if derived is not None:
+            return url_for('static', filename=derived)
+    return url_for('static', filename='units/' + image_path)
 
 
-def get_all_unit_tags(group=unit_tags) -> list[Symbol]:
-    """Returns all tags under the given group. Includes both symbols and groups marked as a unit."""
-    # If it's just a symbol and not a group (thus no children), no recursion was done, simply return the symbol
-    if not group.is_group:
-        return list(group)
+def build_image_srcset(tag: Symbol, fmt: str) -> str:
+    """A srcset of all sizes of the tag's image in the given format, empty if none were built"""
+    image_path = build_image_path(tag)
+    return ', '.join(f'{url_for("static", filename=derived)} {size}w' for size in images.SIZES
+                     if (derived := images.find_derived(image_path, size, fmt)) is not None)
+
 
-    # Was given a group, begin going through its immediate children
-    # All the reversing and left-appends are needed to have the result ordered correctly
-    # extendleft reverses the given iterable when appending, so a reverse to undo that
-    ret = deque()
-    for child in reversed(group.children.values()):
+# Default group of get_all_unit_tags, standing for the current catalog's tree, which can be swapped on reload
+WHOLE_TREE = object()
+
+
+def get_all_unit_tags(group=WHOLE_TREE) -> tuple[Symbol, ...]:
+    """Returns all tags under the given group, or the whole tree if not given one, and none if given None (such as a
+    path that wasn't found). Includes both symbols and groups marked as a unit. Listings are computed for the whole
+    tree at once on first use, and cached until invalidate_unit_tag_listings."""
+    if group is None:
+        return ()
+    catalog = current()
+    if group is WHOLE_TREE:
+        group = catalog.unit_tags
+    # If it's just a symbol and not a group (thus no children), simply return the symbol
+    if not group.is_group:
+        return tuple(group)
+    if not catalog.listings:
+        list_unit_tags(catalog.unit_tags, catalog.listings)
+    listing = catalog.listings.get(group)
+    if listing is None:
+        # A group from outside the unit tags tree, list it along with its subtree. Not cached, it might be of the tree
+        # before a reload, which shouldn't be kept alive.
+        listing = list_unit_tags(group, {})
+    return listing
+
+
+def list_unit_tags(group: Group, listings: dict) -> tuple[Symbol, ...]:
+    """Lists all tags under the given group, storing the listing of every group in its subtree in the given dict
+    on the way, so the whole tree is listed in a single pass."""
+    # The group itself comes first. No need to add groups that aren't units, such as the commands or sections groups.
+    ret = [group] if group.is_unit else []
+    for child in group.children.values():
         # The group builder adds grandchildren whose parent is not a unit to the grandparent
         # This means duplicate symbols when recursing! Add this check to make sure we add only direct children
         if child.parent != group:
             continue
-        # Append only the end symbols, the group itself is added later outside the loop through the recursion
+        # Add only the end symbols, groups add themselves in their own listing
         if isinstance(child, Group):
-            ret.extendleft(reversed(get_all_unit_tags(child)))
+            ret += list_unit_tags(child, listings)
         elif child.is_unit:
-            ret.appendleft(child)
+            ret.append(child)
+    listings[group] = ret = tuple(ret)
+    return ret
 
-    # The for loop above only adds end symbols, this is what adds the groups
-    # No need to add groups that aren't units, such as the commands or sections groups.
-    if group.is_unit:
-        ret.appendleft(group)
 
-    return list(ret)
+def invalidate_unit_tag_listings():
+    """Drops all cached listings of get_all_unit_tags. Must be called when the unit tags tree changes in place."""
+    current().listings.clear()
 
 
-def get_all_tags_in_path(path: str, joiner='/') -> list[Symbol]:
+def get_all_tags_in_path(path: str, joiner='/') -> tuple[Symbol, ...]:
     """Recursively returns all unit tags in a group, specified by path"""
     return get_all_unit_tags(find_unit_tag(path, joiner))
 
 
+def iter_unit_tags(group: Symbol) -> typing.Iterator[Symbol]:
+    """Yields the same tags as get_all_unit_tags in the same order, walking the tree as they're consumed rather than
+    listing them all first"""
+    if group is None:
+        return
+    if not group.is_group:
+        yield from group
+        return
+    if group.is_unit:
+        yield group
+    for child in group.children.values():
+        # Only direct children, see list_unit_tags
+        if child.parent != group:
+            continue
+        if isinstance(child, Group):
+            yield from iter_unit_tags(child)
+        elif child.is_unit:
+            yield child
+
+
+def iter_tags_in_path(path: str, joiner='/') -> typing.Iterator[Symbol]:
+    """Recursively yields all unit tags in a group, specified by path"""
+    return iter_unit_tags(find_unit_tag(path, joiner))
+
+
 def is_parent_symbol(tag: Symbol) -> bool:
     """Is the tag a ParentSymbol, that is a group that is being displayed as a unit and not a group"""
     return isinstance(tag, ParentSymbol)
+
+
+class TagIndex:
+    """A frozen index of a unit tags tree, mapping paths to tags and tags to their paths and image paths.
+    Built once for a tree, after which lookups don't need to walk the tree or build any strings."""
+    __slots__ = ('root', 'tags', 'paths', 'image_paths')
+
+    def __init__(self, root: Group):
+        tags = {}
+        paths = {}
+        image_paths = {}
+        # Every symbol gets its path using the same parent chain build_full_path uses, the root has no path
+        stack = [*root.symbols]
+        while stack:
+            tag = stack.pop()
+            if tag in paths:
+                continue
+            root_path = build_root_path(tag)
+            paths[tag] = root_path + tag.folder
+            image_paths[tag] = root_path + tag.image_name
+            if tag.is_group:
+                stack += tag.symbols
+        paths[root] = ''
+        image_paths[root] = root.image_name
+        # Non-unit groups have their children added to the parent as well, meaning a tag can be reached through
+        # more than a single path. Index all of them, the same way find_unit_tag would follow them.
+        stack = [(root, '')]
+        while stack:
+            group, base = stack.pop()
+            for folder, child in group.children.items():
+                path = base + folder
+                tags[path] = child
+                if child.is_group:
+                    stack.append((child, path + '/'))
+        self.root = root
+        self.tags = MappingProxyType(tags)
+        self.paths = MappingProxyType(paths)
+        self.image_paths = MappingProxyType(image_paths)
+
+    def find(self, path: str) -> Union[Symbol, Group, None]:
+        """Get the tag in the given slash-separated path, or None if there's no such tag"""
+        tag = self.tags.get(path)
+        if tag is None:
+            # Possibly a path with empty folders, such as a trailing slash. Remove those and try again.
+            path = '/'.join(folder for folder in path.split('/') if folder != '')
+            if path == '':
+                return self.root
+            tag = self.tags.get(path)
+        return tag
+
+
+class Catalog:
+    """A unit tags tree along with everything derived from it. Reloads build a whole new catalog and swap it in with
+    a single assignment, so whoever holds a catalog never sees a tree that doesn't match its index or listings."""
+    __slots__ = ('unit_tags', 'index', 'listings', 'derived', 'version')
+
+    def __init__(self, root: Group, version: int = 0):
+        self.unit_tags = root
+        self.index = TagIndex(root)
+        # Listings of every group's subtree, as returned by get_all_unit_tags
+        self.listings: dict[Group, tuple[Symbol, ...]] = {}
+        # Structures other modules derive from the tree, by name, see get_derived
+        self.derived: dict[str, object] = {}
+        # Incremented by every reload, for caches outside the catalog to tell trees apart
+        self.version = version
+
+
+catalog = Catalog(unit_tags)
+# Kept for code reading them directly, updated along with the catalog
+index = catalog.index
+# While a reload builds a catalog, it's set as the current one in the reloading thread's context only
+building: ContextVar[Union[Catalog, None]] = ContextVar('building', default=None)
+# Name -> the function building that derived structure, registered by get_derived
+derived_builders: dict[str, Callable[[], object]] = {}
+
+T = TypeVar('T')
+
+
+def current() -> Catalog:
+    return building.get() or catalog
+
+
+def get_derived(name: str, build: Callable[[], T]) -> T:
+    """The structure of that name derived from the current catalog, built on first use.
+    Reloads build again all structures the previous catalog had before swapping, so they never need to be built while
+    serving a request."""
+    derived = current().derived
+    value = derived.get(name)
+    if value is None:
+        derived_builders.setdefault(name, build)
+        value = derived[name] = build()
+    return value
+
+
+def drop_derived(*names: str):
+    """Drops derived structures of the current catalog, so they're built again on next use"""
+    for name in names:
+        current().derived.pop(name, None)
+
+
+def swap(new: Catalog):
+    """Makes the catalog the current one"""
+    global catalog, unit_tags, index
+    catalog = new
+    unit_tags, index = new.unit_tags, new.index
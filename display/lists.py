@@ -2,11 +2,13 @@ from typing import Iterable, Union
 
 from flask import url_for
 import content as c
+import images
 
 
-def handle_web_request(query: str, recurse: bool) -> Iterable[Union[c.Symbol, c.Group]]:
+def handle_web_request(query: str, recurse: bool, stream: bool = False) -> Iterable[Union[c.Symbol, c.Group]]:
+    """The tags to show in the listing. When streaming, recursive listings walk the tree as the page is rendered."""
     if recurse:
-        ret = c.get_all_tags_in_path(query)
+        ret = c.iter_tags_in_path(query) if stream else c.get_all_tags_in_path(query)
     else:
         ret = c.find_unit_tag(query)
     return filter(should_display_tag, ret)
@@ -38,3 +40,29 @@ def build_href(tag: c.Symbol, r: bool) -> str:
 def build_name(tag: c.Symbol) -> str:
     """Construct the name shown under the unit tag's image. If it's a group that can be opened, adds a '>' character."""
     return f'{tag.name}{" >" if tag.is_group and not c.is_parent_symbol(tag) else ""}'
+
+
+def find_atlas(query: str, recurse: bool) -> Union[images.Atlas, None]:
+    """The atlas to draw the listing's tiles from, if there's one. Only recursive listings have atlases."""
+    if not recurse:
+        return None
+    group = c.find_unit_tag(query)
+    if group is None or not group.is_group:
+        return None
+    return images.find_atlas(c.build_full_path(group))
+
+
+def build_sprite_style(atlas: images.Atlas, tag: c.Symbol) -> Union[str, None]:
+    """Construct the style drawing the tag's image out of the atlas, or None if it's not in the atlas.
+    Sizes and positions are relative, so the sprite scales with the tile like an image would."""
+    tile = atlas.tiles.get(c.build_image_path(tag))
+    if tile is None:
+        return None
+    sheet, x, y, width, height = tile
+    sheet_path, sheet_width, sheet_height = atlas.sheets[sheet]
+    position_x = x / (sheet_width - width) * 100 if sheet_width != width else 0
+    position_y = y / (sheet_height - height) * 100 if sheet_height != height else 0
+    return (f'background-image: url({url_for("static", filename=sheet_path)}); '
+            f'background-size: {sheet_width / width * 100:.3f}%; '
+            f'background-position: {position_x:.3f}% {position_y:.3f}%; '
+            f'width: {width}px; aspect-ratio: {width} / {height}')
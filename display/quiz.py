@@ -1,7 +1,43 @@
 import random
+import threading
+from typing import Union
 
 import content
 
+# The shuffled pool, drawn from the end until it runs out and is shuffled again
+deck: list[content.Symbol] = []
+# The pool the deck was shuffled from, the deck starts over when the catalog is reloaded
+deck_pool: Union[tuple[content.Symbol, ...], None] = None
+deck_lock = threading.Lock()
+
+
+def get_pool() -> tuple[content.Symbol, ...]:
+    """Every unit tag once, even those listed under multiple groups"""
+    return content.get_derived('quiz_pool', lambda: tuple(dict.fromkeys(content.get_all_unit_tags())))
+
+
+def invalidate_pool():
+    """Called when the catalog changes in place"""
+    content.drop_derived('quiz_pool')
+
+
+def random_tags(count: int) -> list[content.Symbol]:
+    """Draws count different tags, at most as many as there are. Tags aren't drawn again until all others were."""
+    global deck_pool
+    pool = get_pool()
+    with deck_lock:
+        if deck_pool is not pool:
+            deck.clear()
+            deck_pool = pool
+        tags = []
+        while len(tags) < min(count, len(pool)):
+            if not deck:
+                # Reshuffled in the middle of the batch, its tags are left out of this round so it doesn't repeat them
+                deck.extend(tag for tag in pool if tag not in tags)
+                random.shuffle(deck)
+            tags.append(deck.pop())
+        return tags
+
 
 def random_tag() -> content.Symbol:
-    return random.choice(content.get_all_unit_tags())
+    return random_tags(1)[0]
@@ -1,59 +1,201 @@
 import datetime
+import json
 import os
+import secrets
 from typing import Union
 
-import app
+from flask import url_for
+
 from content import Symbol
 import content
-import random
+import matching
+import schedule as tag_schedule
 
 
+# Where the files below are, the app's root. Not taken from the app, which imports this module.
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TAG_LIST_FILE = 'tzahle_list.txt'
 START_DATE_FILE = 'tzahle_startdate.txt'
+# The seed and tags of the generated schedule, played after the days of the tag list file if there is one
+SCHEDULE_FILE = 'tzahle_schedule.json'
+# Generated days kept, only about today's are requested
+GENERATED_DAYS_CACHE_SIZE = 8
+# Timezone offsets in minutes, as returned by JavaScript's getTimezoneOffset, of the timezones in use, from UTC+14 to
+# UTC-12. Limiting them limits the days a player can get to today's, yesterday's and tomorrow's.
+MIN_OFFSET = -14 * 60
+MAX_OFFSET = 12 * 60
 
 
 def open_file(which, mode):
-    return open(os.path.join(app.app.root_path, which), mode)
+    return open(os.path.join(ROOT_PATH, which), mode)
+
+
+class TzahleDay:
+    """A day's tag, along with everything needed to answer requests about it, computed once per day"""
+    __slots__ = ('day_num', 'tag', 'path', 'image_url', 'answer', 'offset_body')
+
+    def __init__(self, day_num: int, tag: Symbol):
+        self.day_num = day_num
+        self.tag = tag
+        self.path = content.build_full_path(tag)
+        # Building URLs needs a request, these are computed on the day's first request
+        self.image_url: Union[str, None] = None
+        self.answer: Union[dict, None] = None
+        self.offset_body: Union[str, None] = None
+
+    def prepare(self):
+        """Computes whatever wasn't computed yet. Must be called inside a request."""
+        if self.image_url is None:
+            self.image_url = content.build_full_image_path(self.tag)
+        if self.answer is None:
+            self.answer = {'resp_type': 'answer', 'name': self.tag.name, 'path': self.path,
+                           'rel_path': url_for('units_dir', tag_path=self.path)}
+        if self.offset_body is None:
+            self.offset_body = json.dumps({'day_num': self.day_num, 'image': self.image_url})
+
+    @property
+    def matcher(self) -> matching.AnswerMatcher:
+        return matching.get_matcher(self.tag)
+
 
+class Schedule:
+    """The tag of every day, starting from the start date. The days of the tag list come first, then those generated."""
+    __slots__ = ('start_date', 'days', 'generated', 'generated_days')
 
-day_tag_list: Union[list[Symbol], None] = None
-start_date: Union[datetime.date, None] = None
+    def __init__(self, start_date: datetime.date, tags: list[Symbol],
+                 generated: Union[tag_schedule.TagSchedule[Symbol], None] = None):
+        self.start_date = start_date
+        self.days = tuple(TzahleDay(day_num, tag) for day_num, tag in enumerate(tags))
+        self.generated = generated
+        self.generated_days: dict[int, TzahleDay] = {}
 
+    def day_num(self, date: datetime.date) -> int:
+        return (date - self.start_date).days
 
-def init_if_needed():
-    global day_tag_list
-    global start_date
-    if day_tag_list is None:
+    def get(self, day_num: int) -> Union[TzahleDay, None]:
+        """The day, or None if the day number is before the start date or after the last day"""
+        if 0 <= day_num < len(self.days):
+            return self.days[day_num]
+        if day_num < 0 or self.generated is None:
+            return None
+        day = self.generated_days.get(day_num)
+        if day is None:
+            day = TzahleDay(day_num, self.generated.tag(day_num - len(self.days)))
+            self.generated_days[day_num] = day
+            if len(self.generated_days) > GENERATED_DAYS_CACHE_SIZE:
+                del self.generated_days[next(iter(self.generated_days))]
+        return day
+
+
+def find_tags(paths: list[str], file_name: str) -> list[Symbol]:
+    """The tags of the paths, making sure they're all in the catalog"""
+    tags = [content.find_unit_tag(path) for path in paths]
+    missing = [path for path, tag in zip(paths, tags) if tag is None or tag.is_root]
+    if missing:
+        raise ValueError(f'{file_name} has paths not in the catalog: {", ".join(missing)}')
+    return tags
+
+
+def read_schedule_file() -> Union[dict, None]:
+    if not os.path.exists(os.path.join(ROOT_PATH, SCHEDULE_FILE)):
+        return None
+    with open_file(SCHEDULE_FILE, 'r') as file:
+        return json.load(file)
+
+
+def load_schedule() -> Schedule:
+    """Reads the schedule files, making sure every tag in them is in the catalog"""
+    with open_file(START_DATE_FILE, 'r') as file:
+        start_date = datetime.date.fromisoformat(file.read().strip())
+    tags = []
+    if os.path.exists(os.path.join(ROOT_PATH, TAG_LIST_FILE)):
         with open_file(TAG_LIST_FILE, 'r') as file:
-            day_tag_list = list(map(lambda path: content.find_unit_tag(path.strip()), file.readlines()))
-    if start_date is None:
-        with open_file(START_DATE_FILE, 'r') as file:
-            start_date = datetime.date.fromisoformat(file.read().strip())
+            tags = find_tags([line.strip() for line in file if line.strip() != ''], TAG_LIST_FILE)
+    generated = None
+    schedule_data = read_schedule_file()
+    if schedule_data is not None:
+        generated_tags = find_tags([path for path, _ in schedule_data['tags']], SCHEDULE_FILE)
+        generated = tag_schedule.TagSchedule(bytes.fromhex(schedule_data['seed']),
+                                             [(tag, first_cycle) for tag, (_, first_cycle)
+                                              in zip(generated_tags, schedule_data['tags'])])
+    return Schedule(start_date, tags, generated)
+
 
+def init_if_needed() -> Schedule:
+    """The schedule of the current catalog, loaded on first use"""
+    return content.get_derived('tzahle_schedule', load_schedule)
 
-def get_tag_by_date(date: datetime.date = datetime.date.today()) -> tuple[Symbol, int]:
-    init_if_needed()
-    delta = date - start_date
-    day_num = delta.days
+
+def today() -> datetime.date:
+    """The current UTC date, evaluated on every call"""
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def player_day(offset: int, now: Union[datetime.datetime, None] = None) -> tuple[datetime.date, datetime.datetime]:
+    """The player's date, given their timezone offset in minutes, and when it ends, in UTC"""
+    player_time = (now or datetime.datetime.now(datetime.timezone.utc)) - datetime.timedelta(minutes=offset)
+    next_day = datetime.datetime.combine(player_time.date() + datetime.timedelta(days=1), datetime.time(),
+                                         datetime.timezone.utc)
+    return player_time.date(), next_day + datetime.timedelta(minutes=offset)
+
+
+def is_current_day_num(day_num: int) -> bool:
+    """Whether it's that day somewhere right now, so a player can be playing it"""
+    loaded = init_if_needed()
+    return abs(day_num - loaded.day_num(today())) <= 1
+
+
+def get_day_by_date(date: Union[datetime.date, None] = None) -> Union[TzahleDay, None]:
+    """Returns that date's day, or the UTC day's if given None. None if the date isn't in the schedule."""
+    loaded = init_if_needed()
+    return loaded.get(loaded.day_num(date or today()))
+
+
+def get_day_by_day_num(day_num: Union[int, None]) -> Union[TzahleDay, None]:
+    """Returns that day number's day, or the UTC day's if given None. None if the day isn't in the schedule."""
+    if day_num is None:
+        return get_day_by_date()
+    return init_if_needed().get(day_num)
+
+
+def get_tag_by_date(date: Union[datetime.date, None] = None) -> tuple[Symbol, int]:
+    loaded = init_if_needed()
+    day_num = loaded.day_num(date or today())
     return get_tag_by_day_num(day_num), day_num
 
 
 def get_tag_by_day_num(day_num: Union[int, None]) -> Symbol:
     """Returns that day number's tag, or the tag of the UTC day if given None"""
-    if day_num is None:
-        return get_tag_by_date()[0]
-    init_if_needed()
-    return day_tag_list[day_num]
+    day = get_day_by_day_num(day_num)
+    if day is None:
+        raise IndexError(f'No tag for day {day_num}')
+    return day.tag
 
 
 def generate_tag_list(write_to_file: bool = False) -> list[Symbol]:
-    """Create a list of all unit tags, shuffled, with the possibility of saving the paths of the unit tags to the file,
-    in the order they should be played, overwriting the file."""
-    all_tags = list(set(content.get_all_unit_tags()))
-    random.shuffle(all_tags)
-    if write_to_file:
-        with open_file(TAG_LIST_FILE, 'w') as f:
-            f.writelines(map(lambda tag: content.build_full_path(tag) + '\n', all_tags))
-        with open_file(START_DATE_FILE, 'w') as f:
-            f.write(datetime.date.today().isoformat())
-    return all_tags
+    """Adds the unit tags that aren't in the generated schedule yet to it, with the possibility of saving it to the file.
+    Creates the schedule with a new seed if there is none, starting today unless there's a start date already.
+    Tags are added to the cycles after the one being played, so no day that was played changes.
+    Returns the tags added, in the order they were added."""
+    schedule_data = read_schedule_file() or {'seed': secrets.token_hex(16), 'tags': []}
+    known = {path for path, _ in schedule_data['tags']}
+    all_paths = sorted({content.build_full_path(tag) for tag in content.get_all_unit_tags()})
+    new_paths = [path for path in all_paths if path not in known]
+    first_cycle = 0
+    if schedule_data['tags']:
+        loaded = init_if_needed()
+        # Tomorrow in UTC is already today in the timezones ahead of UTC
+        generated_day = loaded.day_num(today()) + 1 - len(loaded.days)
+        first_cycle = schedule_data['tags'][-1][1]
+        if generated_day >= 0:
+            first_cycle = max(first_cycle, loaded.generated.cycle_of(generated_day) + 1)
+    schedule_data['tags'].extend([path, first_cycle] for path in new_paths)
+    if write_to_file and new_paths:
+        if not os.path.exists(os.path.join(ROOT_PATH, START_DATE_FILE)):
+            with open_file(START_DATE_FILE, 'w') as f:
+                f.write(today().isoformat())
+        with open_file(SCHEDULE_FILE + '.tmp', 'w') as f:
+            json.dump(schedule_data, f, separators=(',', ':'))
+        os.replace(os.path.join(ROOT_PATH, SCHEDULE_FILE + '.tmp'), os.path.join(ROOT_PATH, SCHEDULE_FILE))
+        content.drop_derived('tzahle_schedule')
+    return find_tags(new_paths, SCHEDULE_FILE)
@@ -0,0 +1,121 @@
+"""Server-side storage of players' guesses, so the session cookie only needs to hold an ID no matter how many guesses
+a player makes. Guesses are kept in lists by session ID and kind (such as quiz guesses), and lists that weren't
+updated for longer than the TTL are evicted."""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+
+
+class GuessStore(ABC):
+    @abstractmethod
+    def get(self, session_id: str, kind: str) -> list[str]:
+        """Returns the guesses of that kind, in the order they were added"""
+
+    @abstractmethod
+    def add(self, session_id: str, kind: str, guess: str):
+        pass
+
+    @abstractmethod
+    def clear(self, session_id: str, kind: str):
+        pass
+
+
+class MemoryGuessStore(GuessStore):
+    """Keeps guesses in the worker's memory, evicting the least recently used lists when full.
+    Every worker has its own store, so it fits only a single worker deployment."""
+
+    def __init__(self, ttl: float, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # (session ID, kind) -> (last update time, guesses), least recently used first
+        self.entries: OrderedDict[tuple[str, str], tuple[float, list[str]]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id: str, kind: str) -> list[str]:
+        with self.lock:
+            entry = self.entries.get((session_id, kind))
+            if entry is None or entry[0] < time.monotonic() - self.ttl:
+                return []
+            self.entries.move_to_end((session_id, kind))
+            return list(entry[1])
+
+    def add(self, session_id: str, kind: str, guess: str):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.pop((session_id, kind), None)
+            guesses = entry[1] if entry is not None and entry[0] >= now - self.ttl else []
+            guesses.append(guess)
+            self.entries[(session_id, kind)] = now, guesses
+            self.evict(now)
+
+    def clear(self, session_id: str, kind: str):
+        with self.lock:
+            self.entries.pop((session_id, kind), None)
+
+    def evict(self, now: float):
+        """Removes expired lists, and the least recently used ones over the maximum. Must hold the lock."""
+        while self.entries:
+            key, (updated, _) = next(iter(self.entries.items()))
+            if updated >= now - self.ttl and len(self.entries) <= self.max_entries:
+                break
+            del self.entries[key]
+
+
+class SQLiteGuessStore(GuessStore):
+    """Keeps guesses in a local SQLite database, shared by all workers on the machine.
+    Every list is a single row, with the guesses joined by a separator guesses can't contain."""
+    separator = '\x1f'
+
+    def __init__(self, path: str, ttl: float, evict_every: int = 1000):
+        self.path = path
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.adds = 0
+        # A connection per thread, created on first use so none are shared between forked workers
+        self.local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS guesses '
+                               '(session TEXT, kind TEXT, guesses TEXT, updated REAL, PRIMARY KEY (session, kind))')
+            connection.execute('CREATE INDEX IF NOT EXISTS guesses_updated ON guesses (updated)')
+        return connection
+
+    def get(self, session_id: str, kind: str) -> list[str]:
+        row = self.connection().execute('SELECT guesses FROM guesses WHERE session = ? AND kind = ? AND updated >= ?',
+                                        (session_id, kind, time.time() - self.ttl)).fetchone()
+        return [] if row is None else row[0].split(self.separator)
+
+    def add(self, session_id: str, kind: str, guess: str):
+        now = time.time()
+        guess = guess.replace(self.separator, '')
+        # Appending happens inside a single statement, so concurrent guesses from multiple workers aren't lost.
+        # An expired list is started over rather than appended to.
+        self.connection().execute(
+            'INSERT INTO guesses VALUES (?, ?, ?, ?) ON CONFLICT (session, kind) DO UPDATE SET '
+            'guesses = CASE WHEN updated >= ? THEN guesses || ? || excluded.guesses ELSE excluded.guesses END, '
+            'updated = excluded.updated',
+            (session_id, kind, guess, now, now - self.ttl, self.separator))
+        self.adds += 1
+        if self.adds % self.evict_every == 0:
+            self.evict(now)
+
+    def clear(self, session_id: str, kind: str):
+        self.connection().execute('DELETE FROM guesses WHERE session = ? AND kind = ?', (session_id, kind))
+
+    def evict(self, now: float):
+        self.connection().execute('DELETE FROM guesses WHERE updated < ?', (now - self.ttl,))
+
+
+def create(backend: str, path: str, ttl: float) -> GuessStore:
+    """Creates a store of the given backend, either sqlite (stored in the given path) or memory"""
+    if backend == 'sqlite':
+        return SQLiteGuessStore(path, ttl)
+    if backend == 'memory':
+        return MemoryGuessStore(ttl)
+    raise ValueError(f'Unknown guess store {backend}, expected sqlite or memory')
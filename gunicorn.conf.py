@@ -0,0 +1,32 @@
+"""gunicorn settings for a preloaded deployment, used by default when gunicorn is run from this directory:
+gunicorn --workers 4 wsgi:app
+The app, its catalog and everything derived from it are built once by the master and shared by the workers it forks,
+instead of being built by every worker, so each added worker takes only the memory it writes to. With a single
+worker that saves nothing, and the master's copy costs a few MB more. Set GUNICORN_PRELOAD=0 for every worker to load
+the app itself, as with gunicorn's defaults.
+benchmarks/worker_memory.py measures how much of the workers' memory is shared either way."""
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+if preload_app:
+    # Collections in the master while loading would leave the freed objects' holes in the pages workers share, to be
+    # filled by whatever the first worker to allocate writes there. See the gc.freeze docs.
+    gc.disable()
+
+
+def when_ready(server):
+    """Called in the master after loading the app, right before forking the workers"""
+    if preload_app:
+        import preload
+        preload.warm()
+        preload.freeze()
+
+
+def post_fork(server, worker):
+    """Called in every worker right after it's forked"""
+    if preload_app:
+        import metrics
+        metrics.registry.reset()
+    gc.enable()
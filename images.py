@@ -0,0 +1,220 @@
+"""Resized and re-encoded derivatives of the unit tag images, for pages showing many tags at once, and atlases packing
+the derivatives of every group's subtree into a few sprite sheets, so a recursive listing needs only a few requests.
+Built ahead of time, in parallel and skipping images whose derivatives are up-to-date, with:
+python -m images
+Building needs Pillow. A manifest of the derivatives that were built is written along with them, and derivatives
+missing from it are never linked to, so the site works the same before they're built."""
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+STATIC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DERIVED_FOLDER = 'derived'
+MANIFEST_PATH = os.path.join(STATIC_PATH, DERIVED_FOLDER, 'manifest.json')
+# Widths, in pixels, of the derivatives. Tiles are 200px wide, the larger size is for high density screens.
+SIZES = (200, 400)
+# Formats of the derivatives, in order of preference. PNG is kept as a fallback for browsers supporting neither.
+FORMATS = ('avif', 'webp', 'png')
+SAVE_OPTIONS = {'avif': {'quality': 60}, 'webp': {'quality': 80, 'method': 4}, 'png': {'optimize': True}}
+
+ATLAS_FOLDER = f'{DERIVED_FOLDER}/atlas'
+ATLAS_MANIFEST_PATH = os.path.join(STATIC_PATH, ATLAS_FOLDER, 'manifest.json')
+# Atlases are made of the smallest PNG derivatives, in rows of this many tiles, and sheets of at most this height
+ATLAS_SIZE = SIZES[0]
+ATLAS_COLUMNS = 8
+ATLAS_MAX_HEIGHT = 4096
+
+# Image path (as returned by content.build_image_path) -> the sizes and formats built for it
+manifest: Union[dict[str, frozenset[tuple[int, str]]], None] = None
+# Group path -> its atlas
+atlases: Union[dict[str, 'Atlas'], None] = None
+
+
+class Atlas:
+    """The sprite sheets of a group's subtree, and where in them every image is"""
+    __slots__ = ('sheets', 'tiles')
+
+    def __init__(self, sheets: list[list], tiles: dict[str, list[int]]):
+        # Sheet path inside the static folder, width, height
+        self.sheets: tuple[tuple[str, int, int], ...] = tuple(map(tuple, sheets))
+        # Image path -> sheet index, x, y, width, height
+        self.tiles: dict[str, tuple[int, int, int, int, int]] = {path: tuple(tile) for path, tile in tiles.items()}
+
+
+def derived_path(image_path: str, size: int, fmt: str) -> str:
+    """Path of a derivative inside the static folder"""
+    return f'{DERIVED_FOLDER}/{size}/{os.path.splitext(image_path)[0]}.{fmt}'
+
+
+def load_manifest() -> dict[str, frozenset[tuple[int, str]]]:
+    global manifest
+    if manifest is None:
+        manifest = {}
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH, encoding='utf-8') as file:
+                manifest = {path: frozenset(map(tuple, variants)) for path, variants in json.load(file).items()}
+    return manifest
+
+
+def find_derived(image_path: str, size: int, fmt: str) -> Union[str, None]:
+    """Path of the derivative inside the static folder, or None if it wasn't built"""
+    if (size, fmt) in load_manifest().get(image_path, ()):
+        return derived_path(image_path, size, fmt)
+    return None
+
+
+def load_atlases() -> dict[str, Atlas]:
+    global atlases
+    if atlases is None:
+        atlases = {}
+        if os.path.exists(ATLAS_MANIFEST_PATH):
+            with open(ATLAS_MANIFEST_PATH, encoding='utf-8') as file:
+                atlases = {path: Atlas(**atlas) for path, atlas in json.load(file).items()}
+    return atlases
+
+
+def find_atlas(group_path: str) -> Union[Atlas, None]:
+    """The atlas of the group's subtree, or None if it wasn't built"""
+    return load_atlases().get(group_path)
+
+
+def derive(image_path: str, force: bool = False) -> tuple[str, list[tuple[int, str]], list[str]]:
+    """Builds all derivatives of a single image, skipping those newer than the image.
+    Returns the image path, the derivatives it has, and the paths of the derivatives written."""
+    from PIL import Image
+
+    source = os.path.join(STATIC_PATH, 'units', image_path)
+    source_mtime = os.path.getmtime(source)
+    variants = []
+    written = []
+    image = None
+    for size in SIZES:
+        for fmt in FORMATS:
+            destination = os.path.join(STATIC_PATH, derived_path(image_path, size, fmt))
+            variants.append((size, fmt))
+            if not force and os.path.exists(destination) and os.path.getmtime(destination) >= source_mtime:
+                continue
+            if image is None:
+                image = Image.open(source)
+                image.load()
+                image = image.convert('RGBA')
+            # Never upscale, an image smaller than the size is only re-encoded
+            width = min(size, image.width)
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            resized.save(destination, fmt, **SAVE_OPTIONS[fmt])
+            written.append(destination)
+    return image_path, variants, written
+
+
+def pack_atlas(group_path: str, image_paths: list[str], force: bool = False) -> tuple[str, dict]:
+    """Packs the smallest PNG derivatives of the images into sheets, in rows, in the given order.
+    Returns the group path and its atlas' manifest entry. Sheets newer than all their images aren't written again."""
+    from PIL import Image
+
+    name = group_path.replace('/', '-') or 'root'
+    sources = [os.path.join(STATIC_PATH, derived_path(path, ATLAS_SIZE, 'png')) for path in image_paths]
+    # Lay out the tiles first, sheets can only be drawn once their size is known
+    sheets: list[list] = []
+    tiles = {}
+    sheet_tiles = []
+    x = y = row_height = 0
+    for path, source in zip(image_paths, sources):
+        with Image.open(source) as image:
+            width, height = image.size
+        if x + width > ATLAS_COLUMNS * ATLAS_SIZE:
+            x, y, row_height = 0, y + row_height, 0
+        if not sheets or y + height > ATLAS_MAX_HEIGHT:
+            sheets.append([f'{ATLAS_FOLDER}/{name}-{len(sheets)}.webp', 0, 0])
+            sheet_tiles.append([])
+            x = y = row_height = 0
+        tiles[path] = [len(sheets) - 1, x, y, width, height]
+        sheet_tiles[-1].append((source, x, y))
+        sheets[-1][1] = max(sheets[-1][1], x + width)
+        sheets[-1][2] = max(sheets[-1][2], y + height)
+        x += width
+        row_height = max(row_height, height)
+
+    for sheet, placed in zip(sheets, sheet_tiles):
+        # Sheets are named by their layout, so a sheet with different tiles, such as after adding a tag, is a new file
+        layout = hashlib.blake2b(repr(placed).encode('utf-8'), digest_size=4).hexdigest()
+        sheet[0] = sheet[0].replace('.webp', f'-{layout}.webp')
+        sheet_path, width, height = sheet
+        destination = os.path.join(STATIC_PATH, sheet_path)
+        if not force and os.path.exists(destination) and \
+                all(os.path.getmtime(destination) >= os.path.getmtime(source) for source, _, _ in placed):
+            continue
+        sheet = Image.new('RGBA', (width, height))
+        for source, tile_x, tile_y in placed:
+            with Image.open(source) as image:
+                sheet.paste(image.convert('RGBA'), (tile_x, tile_y))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        sheet.save(destination, 'webp', **SAVE_OPTIONS['webp'])
+    return group_path, {'sheets': sheets, 'tiles': tiles}
+
+
+def build_atlases(built: dict[str, list], executor: ProcessPoolExecutor, force: bool = False):
+    """Builds an atlas for every group's subtree, out of the images whose derivatives were built"""
+    import content
+
+    futures = []
+    # Every group, including those that aren't units such as commands, which get_all_unit_tags doesn't list
+    for group in content.index.paths:
+        if not group.is_group:
+            continue
+        image_paths = []
+        for tag in content.get_all_unit_tags(group):
+            path = content.build_image_path(tag)
+            if (ATLAS_SIZE, 'png') in map(tuple, built.get(path, ())) and path not in image_paths:
+                image_paths.append(path)
+        if image_paths:
+            futures.append(executor.submit(pack_atlas, content.build_full_path(group), image_paths, force))
+    built_atlases = dict(future.result() for future in futures)
+    os.makedirs(os.path.dirname(ATLAS_MANIFEST_PATH), exist_ok=True)
+    with open(ATLAS_MANIFEST_PATH + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(built_atlases, file, separators=(',', ':'))
+    os.replace(ATLAS_MANIFEST_PATH + '.tmp', ATLAS_MANIFEST_PATH)
+    sheets = [sheet for atlas in built_atlases.values() for sheet in atlas['sheets']]
+    total = sum(os.path.getsize(os.path.join(STATIC_PATH, path)) for path, _, _ in sheets)
+    print(f'Wrote atlases of {len(built_atlases)} groups, {len(sheets)} sheets, {total / 1024:.0f}KB')
+
+
+def build(force: bool = False, workers: Union[int, None] = None):
+    """Builds the derivatives of every unit tag's image and the atlases of every group, and writes their manifests"""
+    import content
+
+    image_paths = sorted({content.build_image_path(tag) for tag in content.get_all_unit_tags() if tag.image_name})
+    image_paths = [path for path in image_paths if os.path.exists(os.path.join(STATIC_PATH, 'units', path))]
+    built = {}
+    written = 0
+    with ProcessPoolExecutor(workers) as executor:
+        futures = {path: executor.submit(derive, path, force) for path in image_paths}
+        for path, future in futures.items():
+            try:
+                _, variants, paths = future.result()
+            except Exception as e:
+                # Such as an image Pillow can't read. The original image is used for it.
+                print(f'Skipping {path}: {e}', file=sys.stderr)
+                continue
+            built[path] = variants
+            written += len(paths)
+        build_atlases(built, executor, force)
+
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    with open(MANIFEST_PATH + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(built, file, separators=(',', ':'))
+    os.replace(MANIFEST_PATH + '.tmp', MANIFEST_PATH)
+
+    original = sum(os.path.getsize(os.path.join(STATIC_PATH, 'units', path)) for path in built)
+    print(f'Wrote {written} derivatives of {len(built)} images, {len(image_paths) - len(built)} skipped')
+    for size in SIZES:
+        for fmt in FORMATS:
+            total = sum(os.path.getsize(os.path.join(STATIC_PATH, derived_path(path, size, fmt))) for path in built)
+            print(f'{size}px {fmt}: {total / 1024:.0f}KB, originals {original / 1024:.0f}KB')
+
+
+if __name__ == '__main__':
+    build(force='--force' in sys.argv)
@@ -0,0 +1,245 @@
+import json
+import os
+import re
+from typing import Iterable
+
+import content
+from content import Symbol
+
+# Niqqud and cantillation marks, which players sometimes type but alt names never have
+niqqud_pattern = re.compile('[\u0591-\u05c7]')
+numbers_pattern = re.compile(r'\d+')
+# Like content.no_punc_trans, along with the Hebrew geresh and gershayim, and with all final letters made regular,
+# not only the ones at the end of acronyms
+normalize_trans = str.maketrans({**content.no_punc_trans, **content.final_trans, ord('׳'): None, ord('״'): None})
+
+
+class AnswerMatcher:
+    """Checks guesses against the alt names of a single tag.
+    Holds a suffix automaton over all alt names, so checking whether a word appears in any of them takes time linear
+    in the length of the word, no matter how many alt names the tag has."""
+    __slots__ = ('answers', 'transitions')
+
+    # Separates the alt names inside the automaton. Guesses have their whitespace collapsed to a single space,
+    # so no guess word can contain it, and thus no word can match across two alt names.
+    separator = '\n'
+
+    def __init__(self, alt_names: Iterable[str]):
+        self.answers = frozenset(alt_names)
+        # Every state is a dict of transitions, state 0 is the initial state. Only the transitions are kept after
+        # building, the suffix links and lengths are needed only while building.
+        transitions = [{}]
+        links = [-1]
+        lengths = [0]
+        last = 0
+        for char in self.separator.join(self.answers):
+            cur = len(transitions)
+            transitions.append({})
+            links.append(0)
+            lengths.append(lengths[last] + 1)
+            state = last
+            while state != -1 and char not in transitions[state]:
+                transitions[state][char] = cur
+                state = links[state]
+            if state != -1:
+                following = transitions[state][char]
+                if lengths[state] + 1 == lengths[following]:
+                    links[cur] = following
+                else:
+                    clone = len(transitions)
+                    transitions.append(dict(transitions[following]))
+                    links.append(links[following])
+                    lengths.append(lengths[state] + 1)
+                    while state != -1 and transitions[state].get(char) == following:
+                        transitions[state][char] = clone
+                        state = links[state]
+                    links[following] = links[cur] = clone
+            last = cur
+        self.transitions = tuple(transitions)
+
+    def is_answer(self, guess: str) -> bool:
+        """Is the guess exactly one of the alt names"""
+        return guess in self.answers
+
+    def in_answers(self, word: str) -> bool:
+        """Does the word appear anywhere inside any of the alt names"""
+        transitions = self.transitions
+        state = 0
+        for char in word:
+            state = transitions[state].get(char)
+            if state is None:
+                return False
+        return True
+
+    def hint_indices(self, guess_words: list[str]) -> list[str]:
+        """Indices of all words in the guess that appear in any alt name, as strings, in order"""
+        return [str(i) for i, word in enumerate(guess_words) if self.in_answers(word)]
+
+
+# Matchers of every tag that had a guess checked against it
+def get_matchers() -> dict[Symbol, AnswerMatcher]:
+    """The matchers built so far for the tags of the current catalog"""
+    return content.get_derived('matchers', dict)
+
+
+def get_matcher(tag: Symbol) -> AnswerMatcher:
+    """Returns the tag's matcher, building it the first time it's needed"""
+    matchers = get_matchers()
+    matcher = matchers.get(tag)
+    if matcher is None:
+        matcher = matchers[tag] = AnswerMatcher(tag.alt_names)
+    return matcher
+
+
+def invalidate_matchers():
+    """Drops all built matchers and the fuzzy index. Must be called when alt names change."""
+    content.drop_derived('matchers', 'fuzzy_index')
+
+
+def sanitize_guess(guess: bytes) -> str:
+    """Decodes a guess as sent by a player, removing punctuation and collapsing whitespace to a single space"""
+    return re.sub(r'\s+', ' ', guess.decode('utf-8').translate(content.no_punc_trans).strip())
+
+
+def normalize(text: str) -> str:
+    """Normalizes a name or guess for fuzzy matching, removing niqqud, punctuation and final letters"""
+    return ' '.join(niqqud_pattern.sub('', text).translate(normalize_trans).split())
+
+
+def max_distance(name: str) -> int:
+    """How many edits a guess of that length can be away from an alt name and still be accepted"""
+    if len(name) < 5:
+        return 0
+    if len(name) < 12:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between the strings, or limit + 1 if it's more than the limit.
+    Only cells within limit of the diagonal are computed, as any path through other cells costs more than it."""
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        cur = [over] * (len(b) + 1)
+        low = max(1, i - limit)
+        if low == 1:
+            cur[0] = i if i <= limit else over
+        row_min = cur[0]
+        for j in range(low, min(len(b), i + limit) + 1):
+            cost = prev[j - 1] + (char_a != b[j - 1])
+            if prev[j] + 1 < cost:
+                cost = prev[j] + 1
+            if cur[j - 1] + 1 < cost:
+                cost = cur[j - 1] + 1
+            cur[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > limit:
+            return over
+        prev = cur
+    return min(prev[-1], over)
+
+
+class FuzzyIndex:
+    """Finds the alt names closest to a guess, out of the alt names of every tag, after normalizing both.
+    A character trigram index finds the few alt names that can be close enough to the guess, so only those need
+    their edit distance computed."""
+    __slots__ = ('names', 'name_tags', 'name_grams', 'ids', 'grams')
+
+    gram_size = 3
+
+    def __init__(self, tags: Iterable[Symbol]):
+        name_tags: dict[str, set[Symbol]] = {}
+        for tag in tags:
+            for name in tag.alt_names:
+                name_tags.setdefault(normalize(name), set()).add(tag)
+        name_tags.pop('', None)
+        self.names = tuple(name_tags)
+        self.name_tags = tuple(frozenset(name_tags[name]) for name in self.names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.name_grams = tuple(frozenset(self.split_grams(name)) for name in self.names)
+        grams: dict[str, list[int]] = {}
+        for i, name_grams in enumerate(self.name_grams):
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(i)
+        self.grams = {gram: tuple(ids) for gram, ids in grams.items()}
+
+    @classmethod
+    def split_grams(cls, name: str) -> set[str]:
+        padded = f' {name} '
+        return {padded[i:i + cls.gram_size] for i in range(len(padded) - cls.gram_size + 1)}
+
+    def closest(self, guess: str) -> tuple[int, frozenset[Symbol]]:
+        """Returns the distance of the closest alt names to the already normalized guess, and the tags they belong
+        to. Alt names with numbers different from the guess' never match. No tags if none are close enough."""
+        exact = self.ids.get(guess)
+        if exact is not None:
+            return 0, self.name_tags[exact]
+        limit = max_distance(guess)
+        if limit == 0:
+            return 0, frozenset()
+        grams = self.split_grams(guess)
+        # Every edit changes at most gram_size of the guess' grams, and the rest must all be in a close enough alt name.
+        # That means it must have at least one of any limit * gram_size + 1 of the grams, so look only at the rarest.
+        rarest = sorted((self.grams.get(gram, ()) for gram in grams), key=len)[:limit * self.gram_size + 1]
+        candidates = set().union(*rarest)
+        counts = sorted(((len(grams & self.name_grams[i]), i) for i in candidates), reverse=True)
+        numbers = numbers_pattern.findall(guess)
+        best = limit + 1
+        best_tags = set()
+        # Going from the alt names sharing the most grams with the guess. Once an alt name shares too few grams to be
+        # as close as the best one so far, all the rest are too far as well.
+        for count, i in counts:
+            if count < len(grams) - min(best, limit) * self.gram_size:
+                break
+            name = self.names[i]
+            if abs(len(name) - len(guess)) > limit:
+                continue
+            if numbers_pattern.findall(name) != numbers:
+                continue
+            distance = edit_distance(guess, name, best)
+            if distance > limit:
+                continue
+            if distance < best:
+                best = distance
+                best_tags = set(self.name_tags[i])
+            elif distance == best:
+                best_tags |= self.name_tags[i]
+        return best, frozenset(best_tags)
+
+    def accepts(self, tag: Symbol, guess: str) -> bool:
+        """Is the guess close enough to one of the tag's alt names, and not as close to another tag's"""
+        distance, tags = self.closest(normalize(guess))
+        if distance == 0:
+            return tag in tags
+        return tags == {tag}
+
+
+def get_fuzzy_index() -> FuzzyIndex:
+    """Returns the fuzzy index of all unit tags, building it the first time it's needed"""
+    return content.get_derived('fuzzy_index', lambda: FuzzyIndex(content.get_all_unit_tags()))
+
+
+def is_answer(tag: Symbol, guess: str, fuzzy: bool = False) -> bool:
+    """Is the guess an answer for the tag. Only exact alt names are accepted, unless fuzzy matching is wanted.
+    Doesn't build the tag's matcher, which only hints need."""
+    return guess in tag.alt_names or (fuzzy and get_fuzzy_index().accepts(tag, guess))
+
+
+def load_aliases(path: str):
+    """Adds the aliases in the given file, created by objection_aliases.py, to the alt names of their tags"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as file:
+        aliases: dict[str, list[str]] = json.load(file)
+    for tag_path, guesses in aliases.items():
+        tag = content.find_unit_tag(tag_path)
+        # The tag might have been removed since the file was created
+        if tag is not None and not tag.is_root:
+            tag.alt_names.update(guesses)
+    invalidate_matchers()
+    # Searching covers alt names as well
+    content.drop_derived('search_index')
@@ -0,0 +1,273 @@
+"""Counters and histograms of what the app does, exposed in the Prometheus text format.
+Every thread records into its own values, so recording never waits on a lock, and they're only added up when the
+metrics are collected. Values of threads that exited are added to a total of their own. Every worker process writes its
+values to a file of its own in a shared directory, every few seconds and whenever it's scraped, so a scrape reaching
+any worker sees the values of all of them. Files of workers that exited are merged into a single file when scraped, so
+counters never go back."""
+import bisect
+import fcntl
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+import weakref
+from typing import Callable, Union
+
+PREFIX = 'tzahle_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Name -> help, type, and buckets for histograms. Gauges of all workers are added up, and of workers that exited are
+# dropped.
+METRICS: dict[str, tuple[str, str, Union[tuple[float, ...], None]]] = {
+    'request_duration_seconds': ('Time to handle a request, until the response starts being sent', 'histogram',
+                                 (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5)),
+    'response_size_bytes': ('Size of response bodies, for responses not streamed', 'histogram',
+                            (256, 1024, 4096, 16384, 65536, 262144, 1048576)),
+    'session_cookie_size_bytes': ('Size of the session cookie requests were sent with', 'histogram',
+                                  (0, 64, 128, 256, 512, 1024, 2048, 4096)),
+    'guesses_total': ('Guesses checked, by game and outcome', 'counter', None),
+    'content_lookups_total': ('Calls of content lookup functions', 'counter', None),
+    'content_lookup_seconds_total': ('Time spent inside content lookup functions', 'counter', None),
+    'objection_queue_depth': ('Objections waiting to be written', 'gauge', None),
+    'objection_flushes_total': ('Batches of objections written', 'counter', None),
+    'objection_rows_written_total': ('Objections written', 'counter', None),
+    'objection_flush_seconds_total': ('Time spent writing batches of objections', 'counter', None),
+}
+
+Labels = tuple[tuple[str, str], ...]
+Key = tuple[str, Labels]
+
+
+class ThreadValues:
+    """Owned by a single thread, through the registry's thread local, and dropped when the thread exits"""
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self):
+        self.values: dict[Key, Union[float, list[float]]] = {}
+
+
+class Registry:
+    def __init__(self):
+        self.local = threading.local()
+        # The values of every running thread that recorded anything: counters hold a number, histograms a list of the
+        # count in every bucket, the count above the last bucket, and the sum
+        self.shards: dict[int, dict[Key, Union[float, list[float]]]] = {}
+        # The values of threads that exited, added up
+        self.retired: dict[Key, Union[float, list[float]]] = {}
+        # Values computed when collecting, such as those of other components' stats
+        self.collectors: list[Callable[[], dict[Key, float]]] = []
+        # Taken only when a thread records for the first time or exits, and when collecting
+        self.lock = threading.Lock()
+
+    def shard(self) -> dict:
+        owner = getattr(self.local, 'owner', None)
+        if owner is None:
+            owner = self.local.owner = ThreadValues()
+            with self.lock:
+                self.shards[id(owner)] = owner.values
+            # Called when the thread exits, its thread local dropping the owner
+            finalizer = weakref.finalize(owner, self.retire, id(owner))
+            finalizer.atexit = False
+        return owner.values
+
+    def reset(self):
+        """Drops every value recorded so far. Called in forked workers, which would otherwise count the values the
+        master recorded before forking as their own."""
+        self.shards = {}
+        self.retired = {}
+        self.lock = threading.Lock()
+        # Dropping the master thread's owner retires it into the new, empty shards, where it isn't found
+        self.local = threading.local()
+
+    def retire(self, shard_id: int):
+        with self.lock:
+            values = self.shards.pop(shard_id, None)
+            if values is not None:
+                self.retired = merge((self.retired, values))
+
+    def inc(self, name: str, labels: Labels, amount: float = 1):
+        values = self.shard()
+        values[(name, labels)] = values.get((name, labels), 0) + amount
+
+    def observe(self, name: str, labels: Labels, value: float):
+        values = self.shard()
+        histogram = values.get((name, labels))
+        if histogram is None:
+            histogram = values[(name, labels)] = [0] * (len(METRICS[name][2]) + 2)
+        histogram[bisect.bisect_left(METRICS[name][2], value)] += 1
+        histogram[-1] += value
+
+    def collect(self) -> dict[Key, Union[float, list[float]]]:
+        """The values of all threads added up"""
+        with self.lock:
+            # Copying a dict or a list is atomic, other threads may keep recording meanwhile
+            shards = [self.retired, *(shard.copy() for shard in self.shards.values())]
+        return merge([*({key: list(value) if isinstance(value, list) else value for key, value in shard.items()}
+                        for shard in shards),
+                      *(collector() for collector in self.collectors)])
+
+
+def merge(all_values) -> dict[Key, Union[float, list[float]]]:
+    merged = {}
+    for values in all_values:
+        for key, value in values.items():
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+    return merged
+
+
+registry = Registry()
+
+
+class ProcessFiles:
+    """The values of every worker, each in a file of its own in the directory, and of workers that exited in a single
+    file"""
+    # Named so it's never taken for a worker's file
+    RETIRED_FILE = 'retired.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, directory: str, flush_interval: float):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.thread: Union[threading.Thread, None] = None
+        self.lock = threading.Lock()
+        # Named once the worker first writes, so forked workers each get their own file
+        self.path: Union[str, None] = None
+        self.pid = None
+
+    def start(self):
+        """Starts writing this worker's values periodically. Called on every request, only starts once per worker."""
+        if self.thread is not None and self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.thread is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.path = os.path.join(self.directory, f'{self.pid}-{secrets.token_hex(4)}.json')
+                self.thread = threading.Thread(target=self.run, name='metrics-flush', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.write()
+
+    def write(self):
+        if self.path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        write_values(self.path, registry.collect())
+
+    def read_all(self) -> dict[Key, Union[float, list[float]]]:
+        """The values of all workers added up, after merging the files of workers that exited"""
+        if not os.path.isdir(self.directory):
+            return {}
+        # Taken exclusively while merging, so files aren't read while they're being merged and removed
+        with open(os.path.join(self.directory, self.LOCK_FILE), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.merge_exited()
+                return merge(map(read_values, self.files()))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def files(self) -> list[str]:
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def merge_exited(self):
+        exited = [path for path in self.files()
+                  if os.path.basename(path) != self.RETIRED_FILE and not is_running(os.path.basename(path))]
+        if not exited:
+            return
+        retired_path = os.path.join(self.directory, self.RETIRED_FILE)
+        values = merge([read_values(retired_path), *map(read_values, exited)])
+        # Gauges are of the moment, and workers that exited have none
+        write_values(retired_path, {key: value for key, value in values.items() if METRICS[key[0]][1] != 'gauge'})
+        for path in exited:
+            os.remove(path)
+
+
+def is_running(file_name: str) -> bool:
+    """Whether the worker that writes the file is running, by the PID the file name starts with"""
+    try:
+        os.kill(int(file_name.split('-', 1)[0]), 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_values(path: str) -> dict[Key, Union[float, list[float]]]:
+    try:
+        with open(path, encoding='utf-8') as file:
+            return {(name, tuple(map(tuple, labels))): value for name, labels, value in json.load(file)
+                    if name in METRICS}
+    except (OSError, ValueError):
+        # Not written yet
+        return {}
+
+
+def write_values(path: str, values: dict[Key, Union[float, list[float]]]):
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump([[name, labels, value] for (name, labels), value in values.items()], file, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def render(values: dict[Key, Union[float, list[float]]]) -> str:
+    """The values in the Prometheus text format"""
+    lines = []
+    for name, (description, kind, buckets) in METRICS.items():
+        metric_values = sorted((labels, value) for (key_name, labels), value in values.items() if key_name == name)
+        lines.append(f'# HELP {PREFIX}{name} {description}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for labels, value in metric_values:
+            if buckets is None:
+                lines.append(f'{PREFIX}{name}{format_labels(labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), value):
+                cumulative += count
+                lines.append(f'{PREFIX}{name}_bucket{format_labels((*labels, ("le", str(bound))))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{format_labels(labels)} {value[-1]}')
+            lines.append(f'{PREFIX}{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def timed(name: str, func: Callable) -> Callable:
+    """Wraps the function to count its calls and the time spent in it, labeled by the given name"""
+    labels = (('function', name),)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            values = registry.shard()
+            values[('content_lookups_total', labels)] = values.get(('content_lookups_total', labels), 0) + 1
+            values[('content_lookup_seconds_total', labels)] = \
+                values.get(('content_lookup_seconds_total', labels), 0) + time.perf_counter() - start
+    return wrapper
+
+
+def instrument(module, names: tuple[str, ...]):
+    """Replaces the module's functions with timed ones. Calls through the module, including the module's calls to its
+    own functions, are timed, so a function's time includes the timed functions it calls."""
+    for name in names:
+        setattr(module, name, timed(name, getattr(module, name)))
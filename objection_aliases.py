@@ -0,0 +1,84 @@
+"""Turns guesses players often object over into accepted alt names.
+Every run reads only the objections added since the previous run, counts how many different players objected over each
+guess for each tag, and writes the guesses at least the threshold of players objected over to an alias file, which is
+loaded by the app at startup to extend the tags' alt names. Objections from before players were recorded count as a
+single player altogether. Meant to run periodically:
+python -m objection_aliases [threshold]"""
+import csv
+import io
+import json
+import os
+import sys
+
+import content
+import matching
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+# The same as the app's
+OBJECTIONS_PATH = os.environ.get('OBJECTIONS_PATH', os.path.join(ROOT_PATH, 'objections.csv'))
+ALIASES_PATH = os.environ.get('ALIASES_PATH', os.path.join(ROOT_PATH, 'aliases.json'))
+STATE_PATH = os.path.join(ROOT_PATH, 'objections_state.json')
+DEFAULT_THRESHOLD = 3
+
+
+def read_new_rows(path: str, offset: int) -> tuple[list[list[str]], int]:
+    """Reads the rows added to the objections file after the given offset. Returns them and the offset to continue
+    from, which is after the last complete row, since the last one might still be in the middle of being written."""
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, 'rb') as file:
+        # The file was replaced with a new one, start it from the beginning
+        if os.fstat(file.fileno()).st_size < offset:
+            offset = 0
+        file.seek(offset)
+        data = file.read()
+    end = data.rfind(b'\n') + 1
+    rows = list(csv.reader(io.StringIO(data[:end].decode('utf-8'), newline='')))
+    return rows, offset + end
+
+
+def update(objections_path: str, state_path: str, aliases_path: str, threshold: int) -> dict[str, list[str]]:
+    """Counts the new objections and writes the alias file. Returns the aliases written."""
+    state = {'offset': 0, 'objectors': {}}
+    if os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as file:
+            state = json.load(file)
+    rows, state['offset'] = read_new_rows(objections_path, state['offset'])
+    # Tag path -> guess -> the players who objected over it
+    objectors: dict[str, dict[str, list[str]]] = state['objectors']
+    for tag_path, _, guesses, *rest in rows:
+        # Rows from before objectors were recorded have none
+        objector = rest[0] if rest else ''
+        tag_objectors = objectors.setdefault(tag_path, {})
+        for guess in {matching.sanitize_guess(guess.encode('utf-8')) for guess in guesses.split(';')}:
+            if guess != '' and guess != 'giveup':
+                guess_objectors = tag_objectors.setdefault(guess, [])
+                if objector not in guess_objectors:
+                    guess_objectors.append(objector)
+
+    aliases = {}
+    for tag_path, tag_objectors in sorted(objectors.items()):
+        tag = content.find_unit_tag(tag_path)
+        # The tag might have been removed since
+        if tag is None or tag.is_root:
+            continue
+        guesses = sorted(guess for guess, guess_objectors in tag_objectors.items()
+                         if len(guess_objectors) >= threshold)
+        if guesses:
+            aliases[tag_path] = guesses
+
+    # Write to temporary files and replace, so the app never reads a half written file
+    for path, data in ((aliases_path, aliases), (state_path, state)):
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+    return aliases
+
+
+def main(threshold: str = DEFAULT_THRESHOLD):
+    aliases = update(OBJECTIONS_PATH, STATE_PATH, ALIASES_PATH, int(threshold))
+    print(f'Wrote {sum(map(len, aliases.values()))} aliases for {len(aliases)} tags to {ALIASES_PATH}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,90 @@
+"""Writes quiz objections to a CSV file in batches from a background thread, instead of opening the file on every
+objection. Batches are written under an exclusive file lock, so rows written by multiple workers never interleave."""
+from collections import deque
+import csv
+import fcntl
+import threading
+import time
+from typing import Union
+
+
+class ObjectionSink:
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0):
+        """Rows are written once batch_size of them are waiting, or flush_interval seconds after the last write"""
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rows: deque[tuple[str, ...]] = deque()
+        self.condition = threading.Condition()
+        # Opened and started on the first objection, so none are shared between forked workers
+        self.file = None
+        self.thread: Union[threading.Thread, None] = None
+        self.closed = False
+        # Guards the file, so a flush at shutdown doesn't write along with the background thread
+        self.write_lock = threading.Lock()
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+
+    def add(self, row: tuple[str, ...]):
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('Objection sink is closed')
+            self.rows.append(row)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='objection-sink', daemon=True)
+                self.thread.start()
+            if len(self.rows) >= self.batch_size:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.rows) >= self.batch_size or self.closed, self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Writes all waiting rows"""
+        with self.write_lock:
+            with self.condition:
+                rows = list(self.rows)
+                self.rows.clear()
+            if not rows:
+                return
+            start = time.perf_counter()
+            if self.file is None:
+                self.file = open(self.path, 'a', encoding='utf-8', newline='')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                csv.writer(self.file).writerows(rows)
+                self.file.flush()
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.last_flush_latency = time.perf_counter() - start
+            self.total_flush_latency += self.last_flush_latency
+            self.flushes += 1
+            self.rows_written += len(rows)
+
+    def close(self):
+        """Stops the background thread and writes all waiting rows. Called when the worker exits."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self) -> dict[str, Union[int, float]]:
+        """Queue depth and flush latency, in seconds, for monitoring"""
+        return {'queue_depth': len(self.rows),
+                'flushes': self.flushes,
+                'rows_written': self.rows_written,
+                'last_flush_latency': self.last_flush_latency,
+                'total_flush_latency': self.total_flush_latency,
+                'mean_flush_latency': self.total_flush_latency / self.flushes if self.flushes else 0.0}
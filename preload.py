@@ -0,0 +1,39 @@
+"""Builds everything workers would otherwise build on their first requests, for gunicorn's master to build it once
+before forking them (see gunicorn.conf.py), and keeps the collector from writing to it afterwards.
+Forked workers share the master's memory pages until they write to them. Every object the collector tracks has a
+header the collector writes to whenever it runs, so without freezing, a worker's first collection copies every page
+holding the catalog. Frozen objects are never collected, so this is only for objects that live as long as the app."""
+import gc
+import os
+
+import app
+import assets
+import content
+import display.quiz
+import display.tzahle
+import matching
+import search
+
+
+def warm():
+    """Builds the catalog's listings and derived structures, hashes static files and compiles templates. Of the
+    matchers, only the current Tzahle day's is built, as only Tzahle hints need them and they're large."""
+    content.get_all_unit_tags()
+    if app.app.config['FUZZY_MATCHING']:
+        matching.get_fuzzy_index()
+    search.get_search_index()
+    display.quiz.get_pool()
+    if os.path.exists(os.path.join(app.app.root_path, display.tzahle.START_DATE_FILE)):
+        day = display.tzahle.get_day_by_date()
+        if day is not None:
+            matching.get_matcher(day.tag)
+    assets.build_manifest()
+    for name in app.app.jinja_env.list_templates():
+        app.app.jinja_env.get_template(name)
+
+
+def freeze():
+    """Moves every object allocated so far to the permanent generation, which the collector never scans. Called
+    right before forking, with collections disabled since the start, so no objects were freed between them. There's
+    no collection first either, it would leave the freed objects' holes in the pages workers share."""
+    gc.freeze()
@@ -0,0 +1,137 @@
+"""Profiles single requests, with cProfile for where their time goes, or with tracemalloc for what they allocate.
+CPU profiles are written as pstats files, for python -m pstats or snakeviz. Memory profiles are written as collapsed
+stacks of the allocations made by the request that were still alive when it ended, one stack per line followed by its
+size in bytes, for flamegraph.pl or speedscope. Every profile has a JSON file next to it describing the request.
+Only one request per worker is profiled at a time, as tracemalloc traces every thread, and requests arriving while
+one is profiled aren't."""
+import cProfile
+import io
+import json
+import os
+import pstats
+import secrets
+import threading
+import time
+import tracemalloc
+from typing import Union
+
+MODES = ('cpu', 'memory')
+EXTENSIONS = {'cpu': '.pstats', 'memory': '.collapsed'}
+
+
+class Profile:
+    __slots__ = ('mode', 'method', 'path', 'endpoint', 'start', 'profiler')
+
+    def __init__(self, mode: str, method: str, path: str, endpoint: Union[str, None]):
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.profiler: Union[cProfile.Profile, None] = None
+        self.start = 0.0
+
+
+class Profiler:
+    def __init__(self, directory: str, keep: int = 100, memory_frames: int = 25):
+        """Keeps the last keep profiles in the directory. Memory profiles keep memory_frames frames per allocation."""
+        self.directory = directory
+        self.keep = keep
+        self.memory_frames = memory_frames
+        self.lock = threading.Lock()
+
+    def start(self, mode: str, method: str, path: str, endpoint: Union[str, None]) -> Union[Profile, None]:
+        """Starts profiling the current thread's request, unless another request is profiled"""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            profile = Profile(mode, method, path, endpoint)
+            if mode == 'cpu':
+                profile.profiler = cProfile.Profile()
+                profile.profiler.enable()
+            else:
+                tracemalloc.start(self.memory_frames)
+        except BaseException:
+            self.lock.release()
+            raise
+        profile.start = time.perf_counter()
+        return profile
+
+    def finish(self, profile: Profile, status: int) -> str:
+        """Stops profiling and writes the profile. Returns its name."""
+        try:
+            duration = time.perf_counter() - profile.start
+            if profile.mode == 'cpu':
+                profile.profiler.disable()
+                snapshot = peak = None
+            else:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        finally:
+            self.lock.release()
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{secrets.token_hex(3)}-{profile.mode}'
+        path = os.path.join(self.directory, name)
+        if profile.mode == 'cpu':
+            profile.profiler.dump_stats(path + EXTENSIONS['cpu'])
+        else:
+            with open(path + EXTENSIONS['memory'], 'w', encoding='utf-8') as file:
+                file.writelines(collapse(snapshot))
+        info = {'name': name, 'mode': profile.mode, 'method': profile.method, 'path': profile.path,
+                'endpoint': profile.endpoint, 'status': status, 'time': time.time(), 'duration': duration,
+                'peak': peak}
+        # Written last, profiles are listed only once complete
+        with open(path + '.json.tmp', 'w', encoding='utf-8') as file:
+            json.dump(info, file)
+        os.replace(path + '.json.tmp', path + '.json')
+        self.prune()
+        return name
+
+    def list(self) -> list[dict]:
+        """The kept profiles, newest first"""
+        profiles = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as file:
+                    profiles.append(json.load(file))
+            except (OSError, ValueError):
+                # Pruned by another worker meanwhile
+                continue
+        return sorted(profiles, key=lambda info: info['time'], reverse=True)
+
+    def prune(self):
+        for info in self.list()[self.keep:]:
+            for extension in ('.json', EXTENSIONS.get(info['mode'], '')):
+                try:
+                    os.remove(os.path.join(self.directory, info['name'] + extension))
+                except FileNotFoundError:
+                    pass
+
+    def file_name(self, name: str) -> Union[str, None]:
+        """The name of a kept profile's file, or None if there's no such profile"""
+        for mode, extension in EXTENSIONS.items():
+            if name.endswith('-' + mode) and os.path.basename(name) == name and \
+                    os.path.exists(os.path.join(self.directory, name + extension)):
+                return name + extension
+        return None
+
+    def summary(self, name: str, limit: int = 50) -> str:
+        """A CPU profile's slowest functions by cumulative time, as text"""
+        stream = io.StringIO()
+        stats = pstats.Stats(os.path.join(self.directory, name + EXTENSIONS['cpu']), stream=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+
+def collapse(snapshot: tracemalloc.Snapshot) -> list[str]:
+    """The snapshot's allocations by stack, oldest frame first, in the collapsed stacks format"""
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),
+                                       tracemalloc.Filter(False, __file__)))
+    lines = []
+    for statistic in snapshot.statistics('traceback'):
+        stack = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in statistic.traceback)
+        lines.append(f'{stack} {statistic.size}\n')
+    return lines
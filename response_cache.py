@@ -0,0 +1,49 @@
+"""A cache of rendered pages, for pages that depend only on their URL and the catalog, so repeated requests don't render
+them again. Entries carry an ETag, so browsers holding a page get an empty 304 response instead."""
+from collections import OrderedDict
+import hashlib
+import threading
+from typing import Hashable, Union
+
+
+class CachedPage:
+    __slots__ = ('body', 'etag')
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Least recently used pages are evicted once there are more than max_entries"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.pages: OrderedDict[Hashable, CachedPage] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Union[CachedPage, None]:
+        with self.lock:
+            page = self.pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.pages.move_to_end(key)
+            return page
+
+    def put(self, key: Hashable, body: str) -> CachedPage:
+        page = CachedPage(body.encode('utf-8'))
+        with self.lock:
+            self.pages[key] = page
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.max_entries:
+                self.pages.popitem(last=False)
+        return page
+
+    def invalidate(self):
+        """Drops all pages. Must be called when anything they depend on, such as the catalog, changes."""
+        with self.lock:
+            self.pages.clear()
@@ -0,0 +1,72 @@
+"""Deterministic Tzahle schedule, deriving the tag of any day from a seed, without a list of days.
+Days are split into cycles, each playing every tag once, in the order of a permutation keyed by the seed and the cycle.
+Tags are kept in the order they were added, each with the first cycle it's played in, so tags added to the catalog
+join at a later cycle, and days that were already played never change."""
+import bisect
+import hashlib
+from typing import Generic, Sequence, TypeVar
+
+T = TypeVar('T')
+
+# Rounds of the Feistel network. Schedules only need to look shuffled, not to resist analysis.
+ROUNDS = 4
+
+
+def permute(key: bytes, index: int, size: int) -> int:
+    """Maps the index, in range(size), to its place in the permutation of range(size) chosen by the key.
+    A balanced Feistel network over the fewest even number of bits covering the size, repeated until its result is in
+    range, which on average takes fewer than 4 repeats, as the bits cover less than 4 times the size."""
+    bits = max(2, (size - 1).bit_length())
+    bits += bits % 2
+    half = bits // 2
+    mask = (1 << half) - 1
+    while True:
+        left, right = index >> half, index & mask
+        for r in range(ROUNDS):
+            digest = hashlib.blake2b(right.to_bytes(4, 'big'), digest_size=4, key=key, person=bytes((r,))).digest()
+            left, right = right, left ^ (int.from_bytes(digest, 'big') & mask)
+        index = (left << half) | right
+        if index < size:
+            return index
+
+
+class TagSchedule(Generic[T]):
+    def __init__(self, seed: bytes, tags: Sequence[tuple[T, int]]):
+        """Tags are given with the first cycle they're played in, in the order they were added.
+        First cycles can't decrease, and the first tags must be played from cycle 0."""
+        if not tags or tags[0][1] != 0:
+            raise ValueError('A schedule must start with tags played from cycle 0')
+        if any(earlier[1] > later[1] for earlier, later in zip(tags, tags[1:])):
+            raise ValueError('Tags must be in the order they were added, by their first cycle')
+        self.seed = seed
+        self.tags: tuple[T, ...] = tuple(tag for tag, _ in tags)
+        # Cycles with the same number of tags are the same length. For every run of those: its first day, its first
+        # cycle and the number of tags. The tags played in a cycle are always the first ones.
+        self.segments: list[tuple[int, int, int]] = []
+        for count, (_, first_cycle) in enumerate(tags, 1):
+            if count < len(tags) and tags[count][1] == first_cycle:
+                continue
+            if not self.segments:
+                self.segments.append((0, first_cycle, count))
+            else:
+                day, cycle, previous_count = self.segments[-1]
+                self.segments.append((day + (first_cycle - cycle) * previous_count, first_cycle, count))
+        self.segment_days = [day for day, _, _ in self.segments]
+
+    def locate(self, day_num: int) -> tuple[int, int, int]:
+        """The day's cycle, its position in the cycle, and the number of tags in the cycle"""
+        if day_num < 0:
+            raise IndexError(f'Day {day_num} is before the schedule starts')
+        first_day, first_cycle, count = self.segments[bisect.bisect_right(self.segment_days, day_num) - 1]
+        cycle, position = divmod(day_num - first_day, count)
+        return first_cycle + cycle, position, count
+
+    def cycle_of(self, day_num: int) -> int:
+        return self.locate(day_num)[0]
+
+    def cycle_key(self, cycle: int) -> bytes:
+        return hashlib.blake2b(cycle.to_bytes(8, 'big'), digest_size=16, key=self.seed).digest()
+
+    def tag(self, day_num: int) -> T:
+        cycle, position, count = self.locate(day_num)
+        return self.tags[permute(self.cycle_key(cycle), position, count)]
@@ -0,0 +1,83 @@
+"""Autocomplete search over the names and alt names of every tag and group in the catalog.
+Every word of every name is indexed by the rest of the name from it, in a sorted array, so finding the names having a
+word starting with the query is a binary search. Names are normalized the same way fuzzy matching normalizes them,
+without punctuation and final letters, so a query matches whichever way it's written."""
+import bisect
+
+import content
+import matching
+from content import Symbol
+
+# The most results a search returns
+MAX_LIMIT = 50
+
+
+def normalize(text: str) -> str:
+    return matching.normalize(text).casefold()
+
+
+class SearchIndex:
+    __slots__ = ('keys', 'entries', 'tags', 'short_results')
+
+    # Sorts after every character names can have, so every key starting with a query is before the query followed by it
+    last_char = '\U0010ffff'
+    # Queries this long or shorter match a large part of the index, their results are kept once found. Only queries
+    # having results are kept, which are at most the starts of indexed words this long, however many queries are sent.
+    short_query_length = 2
+
+    def __init__(self, index: content.TagIndex):
+        # Tags reachable by multiple paths are found once, by the path build_full_path gives. A unit group and the
+        # symbol standing for it as a unit share a path, and are found once as well.
+        paths = {}
+        for tag, path in index.paths.items():
+            if tag is not index.root:
+                paths.setdefault(path, tag)
+        self.tags: list[tuple[Symbol, str]] = [(tag, path) for path, tag in paths.items()]
+        self.short_results: dict[str, list[tuple[Symbol, str]]] = {}
+        indexed = []
+        for tag_id, (tag, _) in enumerate(self.tags):
+            for name in {normalize(name) for name in (tag.name, *tag.alt_names)}:
+                start = 0
+                while start < len(name):
+                    # Entries rank by whether they're the start of the name, then by the length of the name
+                    indexed.append((name[start:], start != 0, len(name), tag_id))
+                    start = name.find(' ', start) + 1 or len(name)
+        indexed.sort()
+        self.keys = [key for key, _, _, _ in indexed]
+        self.entries = [(not_first, length, tag_id) for _, not_first, length, tag_id in indexed]
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[Symbol, str]]:
+        """Tags having a name with a word starting with the query, and their paths, best matches first.
+        Tags with a name equal to the query come first, then those with a name starting with it, then the rest, each
+        by the length of the name, so the more of the name the query covers, the sooner it comes."""
+        query = normalize(query)
+        if query == '':
+            return []
+        if len(query) <= self.short_query_length and limit <= MAX_LIMIT:
+            results = self.short_results.get(query)
+            if results is None:
+                results = self.find(query, MAX_LIMIT)
+                if results:
+                    self.short_results[query] = results
+            return results[:limit]
+        return self.find(query, limit)
+
+    def find(self, query: str, limit: int) -> list[tuple[Symbol, str]]:
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query + self.last_char, start)
+        ranks: dict[int, tuple[bool, bool, int]] = {}
+        for key, (not_first, length, tag_id) in zip(self.keys[start:end], self.entries[start:end]):
+            rank = (not_first or key != query, not_first, length)
+            if tag_id not in ranks or rank < ranks[tag_id]:
+                ranks[tag_id] = rank
+        best = sorted(ranks, key=lambda tag_id: (ranks[tag_id], self.tags[tag_id][1]))[:limit]
+        return [self.tags[tag_id] for tag_id in best]
+
+
+def get_search_index() -> SearchIndex:
+    return content.get_derived('search_index', lambda: SearchIndex(content.current().index))
+
+
+def invalidate_search_index():
+    """Called when alt names change"""
+    content.drop_derived('search_index')
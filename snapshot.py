@@ -0,0 +1,165 @@
+"""A compact binary snapshot of the unit tags tree, with its alt names already processed.
+It carries a tree built by a separate process into the running app when reloading the catalog, see
+catalog_reload.py. Importing content always builds the tree from its definitions, as that's no slower than loading
+it from a snapshot. Build and check it with:
+python -m snapshot build [path]
+python -m snapshot check [path]"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from typing import Union
+
+DEFAULT_PATH = 'catalog.snapshot'
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content.py')
+
+MAGIC = b'TZCS'
+VERSION = 1
+# Magic, version, SHA-256 of content.py, and the number of strings, nodes and alt name references
+HEADER = struct.Struct('<4sH32sIII')
+# Parent node, folder, name, image name, path, image path, first alt name reference, number of alt names, flags.
+# Strings are indices in the string table, the root node has no parent and no folder.
+NODE = struct.Struct('<iIIIIIIIB')
+NONE = 0xFFFFFFFF
+IS_GROUP = 1
+IS_UNIT = 2
+IS_ROOT = 4
+
+
+def source_hash() -> bytes:
+    """Hash of content.py, a snapshot is valid only for the exact source it was built from"""
+    with open(SOURCE_PATH, 'rb') as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+def serialize(root) -> bytes:
+    """Serializes the tree under the given root group, including paths and processed alt names of every tag"""
+    import content
+
+    strings: dict[str, int] = {}
+
+    def intern(string: Union[str, None]) -> int:
+        if string is None:
+            return NONE
+        return strings.setdefault(string, len(strings))
+
+    nodes = []
+    alt_refs = []
+    # The tree is written in preorder, only following each group's own children and not those it took from
+    # its non-unit child groups, so building it back with the same constructors results in the same tree
+    stack = [(root, -1)]
+    while stack:
+        tag, parent = stack.pop()
+        index = len(nodes)
+        flags = (tag.is_group and IS_GROUP) | (tag.is_unit and IS_UNIT) | (tag.is_root and IS_ROOT)
+        alt_names = sorted(tag.alt_names - {tag.name})
+        # Walking the parent chain and not using content.index, as the tree isn't necessarily content.unit_tags
+        folder = None if tag.is_root else tag.folder
+        root_path = content.build_root_path(tag)
+        nodes.append(NODE.pack(parent, intern(folder), intern(tag.name), intern(tag.image_name),
+                               intern(root_path + (folder or '')), intern(root_path + tag.image_name),
+                               len(alt_refs), len(alt_names), flags))
+        alt_refs += map(intern, alt_names)
+        if tag.is_group:
+            stack += reversed([(child, index) for child in tag.children.values() if child.parent == tag])
+
+    # All strings are stored as a single UTF-8 block, their offsets are in characters and not bytes so it can be
+    # decoded at once and then sliced
+    offsets = [0]
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+    return b''.join((HEADER.pack(MAGIC, VERSION, source_hash(), len(strings), len(nodes), len(alt_refs)),
+                     struct.pack(f'<{len(offsets)}I', *offsets),
+                     *nodes,
+                     struct.pack(f'<{len(alt_refs)}I', *alt_refs),
+                     ''.join(strings).encode('utf-8')))
+
+
+class Snapshot:
+    """A snapshot file mapped into memory while the tree is built from it. Strings are decoded all at once the first
+    time any of them is needed."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.source_hash, string_count, self.node_count, alt_count = \
+            HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} catalog snapshot')
+        self.offsets_start = HEADER.size
+        self.nodes_start = self.offsets_start + (string_count + 1) * 4
+        self.alt_refs_start = self.nodes_start + self.node_count * NODE.size
+        self.strings_start = self.alt_refs_start + alt_count * 4
+        self.strings = None
+
+    def string(self, index: int) -> Union[str, None]:
+        if index == NONE:
+            return None
+        if self.strings is None:
+            self.strings = str(self.buffer[self.strings_start:], 'utf-8')
+        start, end = struct.unpack_from('<II', self.buffer, self.offsets_start + index * 4)
+        return self.strings[start:end]
+
+    def node(self, index: int) -> tuple:
+        return NODE.unpack_from(self.buffer, self.nodes_start + index * NODE.size)
+
+    def alt_names(self, start: int, count: int) -> list[str]:
+        refs = struct.unpack_from(f'<{count}I', self.buffer, self.alt_refs_start + start * 4)
+        return [self.string(ref) for ref in refs]
+
+    def is_current(self) -> bool:
+        """Was the snapshot built from the current content.py"""
+        return self.source_hash == source_hash()
+
+    def build_tree(self):
+        """Builds the unit tags tree stored in the snapshot, returning its root group"""
+        from content import Group, Symbol
+
+        # Groups can only be built after their children, so build from the last node back to the first
+        records = [self.node(i) for i in range(self.node_count)]
+        children: list[dict] = [{} for _ in records]
+        tag = None
+        for index in reversed(range(self.node_count)):
+            parent, folder, name, image_name, _, _, alt_start, alt_count, flags = records[index]
+            name = self.string(name)
+            alt_names = self.alt_names(alt_start, alt_count)
+            if flags & IS_GROUP:
+                # Children were added last to first, reverse them back to their original order
+                tag = Group(name, [], self.string(image_name), dict(reversed(children[index].items())),
+                            is_unit=bool(flags & IS_UNIT), is_root=bool(flags & IS_ROOT))
+            else:
+                tag = Symbol(name, [], self.string(image_name))
+            # The alt names are already processed, prevent processing them again
+            tag.alt_names = {name, *alt_names}
+            if parent != -1:
+                children[parent][self.string(folder)] = tag
+        return tag
+
+    def close(self):
+        self.buffer.close()
+
+
+def main(command: str, path: str = DEFAULT_PATH):
+    import content
+
+    data = serialize(content.unit_tags)
+    if command == 'build':
+        with open(path, 'wb') as file:
+            file.write(data)
+        print(f'Wrote {len(data)} bytes to {path}')
+    elif command == 'check':
+        with open(path, 'rb') as file:
+            if file.read() != data:
+                sys.exit(f'{path} does not match the definitions in content.py, rebuild it')
+        # Make sure what's read back results in the same tree as well
+        snapshot = Snapshot(path)
+        if serialize(snapshot.build_tree()) != data:
+            sys.exit(f'{path} does not result in the same tree as content.py')
+        print(f'{path} matches content.py')
+    else:
+        sys.exit(f'Unknown command {command}, expected build or check')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -10,6 +10,12 @@ $(() => {
     let score = $("#score-num")
     let tagLink = $("#unit_tag_link")
     let giveup = $("#giveup")
+    let tagImg = $("#unit_tag_link > img")
+    let guessBtnText = guessBtn.text()
+
+    // Tags to move to when pressing next, with their images loaded ahead
+    let queue = []
+    let queueLoading = false
 
     function setDisabled(elem, state) {
         elem.prop("disabled", state)
@@ -77,10 +83,55 @@ $(() => {
         checkGuess()
     })
 
+    function fillQueue() {
+        if (queueLoading || queue.length > 1) {
+            return
+        }
+        queueLoading = true
+        $.getJSON("/quiz/queue", (data) => {
+            for (let tag of data["tags"]) {
+                new Image().src = tag["image"]
+                queue.push(tag)
+            }
+        }).always(() => {
+            queueLoading = false
+        })
+    }
+
+    function resetRound(image) {
+        guessedSomething = false
+        tagImg.attr("src", image)
+        tagLink.removeAttr("href")
+        answer.hide()
+        message.hide()
+        guessBox.val("")
+        setAllowInputGuess(true)
+        setDisabled(giveup, false)
+        guessBtn.text(guessBtnText)
+        guessBtn.unbind("click")
+        guessBtn.on("click", () => {
+            checkGuess()
+        })
+    }
+
     $("#next").click(() => {
-        location.reload()
+        let tag = queue.shift()
+        if (tag === undefined) {
+            location.reload()
+            return
+        }
+        $.post({
+            url: "/quiz/next", data: tag["token"], contentType: contentType, success: () => {
+                resetRound(tag["image"])
+                fillQueue()
+            }
+        }).fail(() => {
+            location.reload()
+        })
     })
 
+    fillQueue()
+
     function showObjectionBtn() {
         guessBtn.text("הניחוש שלי נכון!")
         guessBtn.unbind('click')
@@ -3,12 +3,13 @@ $(() => {
 
     // The site first needs to find out the player's timezone, to know what tag to show
     // It accepts only a timezone and not time, to prevent players from scraping the complete list
-    // The server will find the player's date with UTC time and the received offset, then return the tag's path to image
+    // The server will find the player's date with UTC time and the received offset, then return the day's number and
+    // the tag's path to image. It's the same for everyone in the timezone, so it's cached until the day ends.
     let offset = new Date().getTimezoneOffset()
-    $.post({
-        url: '/tzahle/offset', data: offset.toString(), contentType: 'text/plain;charset=UTF-8', success: (data) => {
-            imgTag.attr("src", data)
-        }
+    let dayNum = null
+    $.getJSON('/tzahle/offset/' + offset.toString(), (data) => {
+        dayNum = data["day_num"]
+        imgTag.attr("src", data["image"])
     })
 
     // // Build input boxes in DOM
@@ -103,7 +104,7 @@ $(() => {
     function submitGuess() {
         if (activeInputBox()) {
             $.post({
-                url: "/tzahle",
+                url: dayNum === null ? "/tzahle" : "/tzahle?day=" + dayNum,
                 data: getActiveInputContent(),
                 contentType: 'text/plain;charset=UTF-8',
                 success: (data) => {
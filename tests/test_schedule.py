@@ -0,0 +1,69 @@
+"""Checks the generated Tzahle schedule over thousands of days"""
+import pytest
+
+import content
+import schedule
+
+DAYS = 20000
+SEED = bytes(range(16))
+OTHER_SEED = bytes(range(16, 32))
+
+
+@pytest.fixture(scope='module')
+def paths() -> list[str]:
+    return sorted({content.build_full_path(tag) for tag in content.get_all_unit_tags()})
+
+
+def check_cycles(generated: schedule.TagSchedule, days: int):
+    """Every cycle plays every one of its tags exactly once"""
+    day_num = 0
+    while day_num < days:
+        cycle, position, count = generated.locate(day_num)
+        assert position == 0
+        played = [generated.tag(day) for day in range(day_num, day_num + count)]
+        assert sorted(played) == sorted(generated.tags[:count]), f'Cycle {cycle} repeats a tag'
+        day_num += count
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 16, 17, 269, 1000])
+def test_permute_is_a_permutation(size):
+    assert sorted(schedule.permute(SEED, index, size) for index in range(size)) == list(range(size))
+
+
+def test_cycles_play_every_tag_once(paths):
+    check_cycles(schedule.TagSchedule(SEED, [(path, 0) for path in paths]), DAYS)
+
+
+def test_same_seed_same_schedule(paths):
+    generated = schedule.TagSchedule(SEED, [(path, 0) for path in paths])
+    again = schedule.TagSchedule(SEED, [(path, 0) for path in paths])
+    assert [generated.tag(day) for day in range(DAYS)] == [again.tag(day) for day in range(DAYS)]
+
+
+def test_other_seed_other_schedule(paths):
+    generated = schedule.TagSchedule(SEED, [(path, 0) for path in paths])
+    other = schedule.TagSchedule(OTHER_SEED, [(path, 0) for path in paths])
+    assert [generated.tag(day) for day in range(10)] != [other.tag(day) for day in range(10)]
+
+
+def test_added_tags_keep_past_days(paths):
+    """Tags added while some day is played join at the next cycle, leaving every day before it as it was"""
+    tags = [(path, 0) for path in paths]
+    generated = schedule.TagSchedule(SEED, tags)
+    played_day = len(paths) * 3 + len(paths) // 2
+    for added in range(5):
+        first_cycle = generated.cycle_of(played_day) + 1
+        tags += [(f'added/{added}/{i}', first_cycle) for i in range(added + 1)]
+        grown = schedule.TagSchedule(SEED, tags)
+        assert [grown.tag(day) for day in range(played_day + 1)] == \
+               [generated.tag(day) for day in range(played_day + 1)]
+        check_cycles(grown, DAYS)
+        generated = grown
+        played_day += len(paths) * 2
+    assert len(generated.segments) == 6
+
+
+@pytest.mark.parametrize('tags', [[], [('a', 1)], [('a', 0), ('b', 2), ('c', 1)]])
+def test_invalid_tags(tags):
+    with pytest.raises(ValueError):
+        schedule.TagSchedule(SEED, tags)